@@ -0,0 +1,43 @@
+import random
+import sys
+
+from minesweeper import Minesweeper, MinesweeperAI
+from simulate import percentile, play
+
+# Expert board
+HEIGHT = 16
+WIDTH = 30
+MINES = 99
+
+
+def main():
+    if len(sys.argv) > 2:
+        sys.exit("Usage: python benchmark.py [games]")
+    games = int(sys.argv[1]) if len(sys.argv) == 2 else 20
+
+    latencies = []
+    sizes = []
+    wins = 0
+    for seed in range(games):
+        random.seed(seed)
+        won, moves = play(Minesweeper(HEIGHT, WIDTH, MINES),
+                          MinesweeperAI(HEIGHT, WIDTH, MINES))
+        wins += won
+        for latency, size in moves:
+            latencies.append(latency)
+            sizes.append(size)
+
+    # Print results
+    latencies.sort()
+    print(f"Expert games ({HEIGHT}x{WIDTH}, {MINES} mines): {games}, won {wins}")
+    print(f"  Moves: {len(latencies)}")
+    print(f"  Mean latency: {1000 * sum(latencies) / len(latencies):.3f} ms")
+    for p in [50, 90, 99]:
+        print(f"  p{p} latency: {1000 * percentile(latencies, p):.3f} ms")
+    print(f"  Max latency: {1000 * latencies[-1]:.3f} ms")
+    print(f"  Mean knowledge size: {sum(sizes) / len(sizes):.1f} sentences")
+    print(f"  Max knowledge size: {max(sizes)} sentences")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,39 @@
 import itertools
+import math
 import random
-import copy
+
+from collections import deque
+from functools import lru_cache
+
+# Offsets of the cells within one row and column of a cell
+NEIGHBORS = [
+    (di, dj)
+    for di in (-1, 0, 1)
+    for dj in (-1, 0, 1)
+    if (di, dj) != (0, 0)
+]
+
+
+@lru_cache(maxsize=None)
+def neighbors(cell, height, width):
+    """
+    Returns a tuple of the cells within one row and column of `cell`
+    that lie on a `height` by `width` board, not including the cell itself.
+    """
+    i, j = cell
+    return tuple(
+        (i + di, j + dj) for di, dj in NEIGHBORS
+        if 0 <= i + di < height and 0 <= j + dj < width
+    )
 
 
 class Minesweeper():
     """
     Minesweeper game representation
+
+    The board is stored as bitsets (Python integers) with bit
+    i * (width + 1) + j standing for cell (i, j); the spare column
+    keeps neighbors from wrapping around to the next row.
     """
 
     def __init__(self, height=8, width=8, mines=8):
@@ -13,27 +41,63 @@ class Minesweeper():
         # Set initial width, height, and number of mines
         self.height = height
         self.width = width
-        self.mines = set()
+        self.stride = width + 1
 
-        # Initialize an empty field with no mines
-        self.board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(False)
-            self.board.append(row)
+        # Add mines randomly, sampling distinct cells without rejection
+        positions = random.sample(range(height * width), mines)
+        self.mines = set(divmod(position, width) for position in positions)
+        self.mine_bits = self.to_bits(self.mines)
 
-        # Add mines randomly
-        while len(self.mines) != mines:
-            i = random.randrange(height)
-            j = random.randrange(width)
-            if not self.board[i][j]:
-                self.mines.add((i, j))
-                self.board[i][j] = True
+        # Count the nearby mines of every cell at once
+        self.counts = self.count_nearby_mines()
 
         # At first, player has found no mines
         self.mines_found = set()
 
+    @property
+    def board(self):
+        """
+        2D list of booleans telling whether each cell is a mine.
+        """
+        return [
+            [(i, j) in self.mines for j in range(self.width)]
+            for i in range(self.height)
+        ]
+
+    def to_bits(self, cells):
+        """
+        Returns the bitset holding the given cells.
+        """
+        bitmap = bytearray((self.height * self.stride + 7) // 8)
+        for i, j in cells:
+            position = i * self.stride + j
+            bitmap[position >> 3] |= 1 << (position & 7)
+        return int.from_bytes(bitmap, "little")
+
+    def count_nearby_mines(self):
+        """
+        Returns the number of nearby mines of every cell, as four bit
+        planes (bytes objects) holding the bits of each cell's count.
+
+        The mine bitset is shifted once per neighbor direction, and the
+        eight shifted bitsets are summed with a bitwise ripple-carry adder,
+        so the whole board is counted with a few dozen integer operations.
+        """
+        planes = [0, 0, 0, 0]
+        for di, dj in NEIGHBORS:
+            offset = di * self.stride + dj
+            if offset > 0:
+                carry = self.mine_bits >> offset
+            else:
+                carry = self.mine_bits << -offset
+            for k in range(len(planes)):
+                planes[k], carry = planes[k] ^ carry, planes[k] & carry
+
+        # Bits beyond the board hold no cells, so they can be dropped
+        size = (self.height * self.stride + 7) // 8
+        mask = (1 << (8 * size)) - 1
+        return [(plane & mask).to_bytes(size, "little") for plane in planes]
+
     def print(self):
         """
         Prints a text-based representation
@@ -42,7 +106,7 @@ class Minesweeper():
         for i in range(self.height):
             print("--" * self.width + "-")
             for j in range(self.width):
-                if self.board[i][j]:
+                if (i, j) in self.mines:
                     print("|X", end="")
                 else:
                     print("| ", end="")
@@ -50,8 +114,7 @@ class Minesweeper():
         print("--" * self.width + "-")
 
     def is_mine(self, cell):
-        i, j = cell
-        return self.board[i][j]
+        return cell in self.mines
 
     def nearby_mines(self, cell):
         """
@@ -59,23 +122,11 @@ class Minesweeper():
         within one row and column of a given cell,
         not including the cell itself.
         """
-
-        # Keep count of nearby mines
+        position = cell[0] * self.stride + cell[1]
+        byte, bit = position >> 3, position & 7
         count = 0
-
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
-
+        for k, plane in enumerate(self.counts):
+            count |= ((plane[byte] >> bit) & 1) << k
         return count
 
     def won(self):
@@ -90,15 +141,27 @@ class Sentence():
     Logical statement about a Minesweeper game
     A sentence consists of a set of board cells,
     and a count of the number of those cells which are mines.
+
+    Sentences are immutable, with cells stored as a frozenset, so that
+    they can be hashed and kept in sets; marking a cell returns a new
+    sentence rather than changing this one.
     """
 
+    __slots__ = ("cells", "count")
+
     def __init__(self, cells, count):
-        self.cells = set(cells)
-        self.count = count
+        object.__setattr__(self, "cells", frozenset(cells))
+        object.__setattr__(self, "count", count)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Sentence is immutable")
 
     def __eq__(self, other):
         return self.cells == other.cells and self.count == other.count
 
+    def __hash__(self):
+        return hash((self.cells, self.count))
+
     def __str__(self):
         return f"{self.cells} = {self.count}"
 
@@ -122,46 +185,136 @@ class Sentence():
 
     def mark_mine(self, cell):
         """
-        Updates internal knowledge representation given the fact that
-        a cell is known to be a mine.
+        Returns the sentence left given the fact that a cell is known
+        to be a mine, or None if the cell is not in the sentence.
         """
         # If the cell is in the sentence, remove it and decrement the count by 1
         if cell in self.cells:
-            self.cells.remove(cell)
-            self.count -= 1
-        return
+            return Sentence(self.cells - {cell}, self.count - 1)
+        return None
 
     def mark_safe(self, cell):
         """
-        Updates internal knowledge representation given the fact that
-        a cell is known to be safe.
+        Returns the sentence left given the fact that a cell is known
+        to be safe, or None if the cell is not in the sentence.
         """
         # If the cell is in the sentence, remove it
         if cell in self.cells:
-            self.cells.remove(cell)
-        return
+            return Sentence(self.cells - {cell}, self.count)
+        return None
+
+
+def solve_component(sentences):
+    """
+    Returns the sets of cells (mines, safes) determined by a group
+    of sentences.
+
+    Each sentence is an equation saying its cells, as 0/1 variables,
+    sum to its count. The equations are reduced with Gauss-Jordan
+    elimination (kept in integers), and each reduced equation is then
+    checked against its bounds: if the count equals the sum of the
+    positive coefficients, every cell with a positive coefficient must be
+    a mine and every cell with a negative one must be safe, and
+    symmetrically if it equals the sum of the negative coefficients.
+    """
+    cells = sorted(set().union(*(sentence.cells for sentence in sentences)))
+    column = {cell: c for c, cell in enumerate(cells)}
+    rows = []
+    for sentence in sentences:
+        row = [0] * (len(cells) + 1)
+        for cell in sentence.cells:
+            row[column[cell]] = 1
+        row[-1] = sentence.count
+        rows.append(row)
+
+    # Eliminate each column from every row but its pivot row
+    pivot = 0
+    for c in range(len(cells)):
+        if pivot == len(rows):
+            break
+        r = next((r for r in range(pivot, len(rows)) if rows[r][c]), None)
+        if r is None:
+            continue
+        rows[pivot], rows[r] = rows[r], rows[pivot]
+        pivot_row = rows[pivot]
+        for r, row in enumerate(rows):
+            if r == pivot or not row[c]:
+                continue
+            a, b = pivot_row[c], row[c]
+            row = [a * x - b * y for x, y in zip(row, pivot_row)]
+            divisor = math.gcd(*row)
+            rows[r] = [x // divisor for x in row] if divisor > 1 else row
+        pivot += 1
+
+    # Check each equation against the bounds of its left-hand side
+    mines = set()
+    safes = set()
+    for row in rows:
+        high = sum(x for x in row[:-1] if x > 0)
+        low = sum(x for x in row[:-1] if x < 0)
+        if row[-1] == high:
+            positive, negative = mines, safes
+        elif row[-1] == low:
+            positive, negative = safes, mines
+        else:
+            continue
+        for cell, x in zip(cells, row):
+            if x > 0:
+                positive.add(cell)
+            elif x < 0:
+                negative.add(cell)
+    return mines, safes
 
 
 class MinesweeperAI():
     """
     Minesweeper game player
+
+    With `solver` set to "subset", sentences are combined pairwise using
+    the subset rule. With "linear", the components touched by each move
+    are also solved as systems of linear equations, which finds
+    deductions that need several overlapping sentences at once.
     """
 
-    def __init__(self, height=8, width=8):
+    def __init__(self, height=8, width=8, mines=None, solver="subset"):
 
         # Set initial height and width
         self.height = height
         self.width = width
 
+        # Total number of mines on the board, if known
+        self.total_mines = mines
+
+        # How to draw conclusions from the knowledge base
+        if solver not in ("subset", "linear"):
+            raise ValueError(f"unknown solver: {solver}")
+        self.solver = solver
+
         # Keep track of which cells have been clicked on
         self.moves_made = set()
 
+        # Cells that have not been chosen and are not known to be mines
+        self.unexplored = set(itertools.product(range(height), range(width)))
+
         # Keep track of cells known to be safe or mines
         self.mines = set()
         self.safes = set()
 
-        # List of sentences about the game known to be true
-        self.knowledge = []
+        # Set of sentences about the game known to be true
+        self.knowledge = set()
+
+        # Index from each cell to the sentences that mention it
+        self.cell_sentences = dict()
+
+        # Sentences that changed since conclusions were last drawn from them
+        self.pending = deque()
+
+        # Sentences added or changed since the linear solver last ran,
+        # only kept track of with the "linear" solver
+        self.touched = set()
+
+        # Configuration counts of frontier components, keyed by their sentences
+        self.component_counts = dict()
 
     def mark_mine(self, cell):
         """
@@ -169,8 +322,13 @@ class MinesweeperAI():
         to mark that cell as a mine as well.
         """
         self.mines.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_mine(cell)
+        self.unexplored.discard(cell)
+
+        # Only the sentences mentioning the cell need updating, each
+        # replaced by the sentence left without the cell
+        for sentence in self.cell_sentences.pop(cell, set()):
+            self.remove_sentence(sentence)
+            self.add_sentence(sentence.mark_mine(cell))
 
     def mark_safe(self, cell):
         """
@@ -178,8 +336,94 @@ class MinesweeperAI():
         to mark that cell as safe as well.
         """
         self.safes.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_safe(cell)
+
+        # Only the sentences mentioning the cell need updating, each
+        # replaced by the sentence left without the cell
+        for sentence in self.cell_sentences.pop(cell, set()):
+            self.remove_sentence(sentence)
+            self.add_sentence(sentence.mark_safe(cell))
+
+    def add_sentence(self, sentence):
+        """
+        Adds a sentence to the knowledge base and schedules it for inference.
+        Sentences that are empty (fully resolved) or already known are
+        dropped, so the knowledge base never holds garbage or duplicates.
+        """
+        if not sentence.cells or sentence in self.knowledge:
+            return
+        self.knowledge.add(sentence)
+        for cell in sentence.cells:
+            self.cell_sentences.setdefault(cell, set()).add(sentence)
+        self.pending.append(sentence)
+        if self.solver == "linear":
+            self.touched.add(sentence)
+
+    def remove_sentence(self, sentence):
+        """
+        Removes a sentence from the knowledge base and the cell index.
+        """
+        self.knowledge.discard(sentence)
+        self.touched.discard(sentence)
+        for cell in sentence.cells:
+            sentences = self.cell_sentences.get(cell)
+            if sentences is not None:
+                sentences.discard(sentence)
+                if not sentences:
+                    del self.cell_sentences[cell]
+
+    def related_sentences(self, sentence):
+        """
+        Returns the set of sentences other than `sentence` that share
+        at least one cell with it.
+        """
+        related = set()
+        for cell in sentence.cells:
+            related.update(self.cell_sentences.get(cell, ()))
+        related.discard(sentence)
+        return related
+
+    def infer(self):
+        """
+        Draws conclusions from pending sentences until no sentence
+        in the knowledge base has changed.
+
+        A sentence whose cells are all safe or all mines marks those
+        cells, which in turn reschedules the sentences sharing them.
+        Otherwise, the subset rule is applied against sentences that
+        share a cell with it, since disjoint sentences cannot be subsets.
+        """
+        while self.pending:
+            sentence = self.pending.popleft()
+
+            # The sentence may have been resolved or merged since it was queued
+            if sentence not in self.knowledge:
+                continue
+
+            # Mark any cells the sentence determines
+            mines = sentence.known_mines()
+            safes = sentence.known_safes()
+            if mines or safes:
+                for mine in mines:
+                    self.mark_mine(mine)
+                for safe in safes:
+                    self.mark_safe(safe)
+                continue
+
+            # Infer new sentences from subset relations with related sentences
+            inferred = []
+            for other in self.related_sentences(sentence):
+                if sentence.cells < other.cells:
+                    inferred.append(Sentence(
+                        other.cells - sentence.cells,
+                        other.count - sentence.count
+                    ))
+                elif other.cells < sentence.cells:
+                    inferred.append(Sentence(
+                        sentence.cells - other.cells,
+                        sentence.count - other.count
+                    ))
+            for new_sentence in inferred:
+                self.add_sentence(new_sentence)
 
     def add_knowledge(self, cell, count):
         """
@@ -198,64 +442,55 @@ class MinesweeperAI():
         """
         # 1) Mark the cell as a move that has been made
         self.moves_made.add(cell)
+        self.unexplored.discard(cell)
 
         # 2) Mark the cell as safe
         self.mark_safe(cell)
 
         # 3) Add a new sentence to the AI's knowledge base based on the value of `cell` and `count`
-        # Create a new set of cells
         sentence_cells = set()
-        # Copy the count of the cells
-        copy_count = copy.deepcopy(count)
-        # Loop over the surrounding cells
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
+        for neighbor in neighbors(cell, self.height, self.width):
 
-                # Ignore the cell itself and any cells already marked as safe
-                if (i, j) == cell or (i, j) in self.safes:
-                    continue
+            # Ignore cells already marked as safe
+            if neighbor in self.safes:
+                continue
 
-                # If the cell is a mine, decrement the count by 1
-                if (i, j) in self.mines:
-                    copy_count -= 1
-                    continue
-
-                # Add other cells to the sentence (Remember to check if the cell is in bounds)
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    sentence_cells.add((i, j))
-        # Add the sentence to the knowledge base (Remember to check if the sentence is empty)
-        if len(sentence_cells) > 0:
-            self.knowledge.append(Sentence(sentence_cells, copy_count))
-
-        # 4) Mark any additional cells as safe or as mines if it can be concluded based on the AI's knowledge base
-        kb_changed = True # Keep track of whether the knowledge base has changed
-        while kb_changed:
-            kb_changed = False
-            # Loop over the knowledge base
-            for sentence in self.knowledge:
-                # If the sentence contains known mines, mark them as mines
-                if sentence.known_mines() != None:
-                    for mine in sentence.known_mines():
-                        self.mark_mine(mine)
-                        kb_changed = True
-                # If the sentence contains known safes, mark them as safes
-                if sentence.known_safes() != None:
-                    for safe in sentence.known_safes():
-                        self.mark_safe(safe)
-                        kb_changed = True
-
-        # 5) Add any new sentences to the AI's knowledge base if they can be inferred from existing knowledge
-        for sentence_a in self.knowledge:
-            for sentence_b in self.knowledge:
-                # Skip if sentence_a equals sentence_b
-                if sentence_a == sentence_b: continue
-                # If sentence_a is a subset of sentence_b, create a new sentence
-                if sentence_a.cells.issubset(sentence_b.cells):
-                    new_sentence = Sentence(sentence_b.cells - sentence_a.cells, sentence_b.count - sentence_a.count)
-                    # If the new sentence is not already in the knowledge base, add it
-                    if new_sentence not in self.knowledge:
-                        self.knowledge.append(new_sentence)
-        return
+            # If the cell is a mine, decrement the count by 1
+            if neighbor in self.mines:
+                count -= 1
+                continue
+
+            sentence_cells.add(neighbor)
+        self.add_sentence(Sentence(sentence_cells, count))
+
+        # 4) and 5) Propagate the new sentence and everything it changes
+        self.infer()
+        if self.solver == "linear":
+            self.solve()
+
+    def solve(self):
+        """
+        Solves the components touched since the last call as linear
+        systems, marking the cells they determine, until no
+        further cells can be determined.
+        """
+        while self.touched:
+            components = self.components(self.touched)
+            self.touched = set()
+
+            mines = set()
+            safes = set()
+            for component in components:
+                component_mines, component_safes = solve_component(component)
+                mines |= component_mines
+                safes |= component_safes
+
+            # Marking cells touches their components again
+            for mine in mines:
+                self.mark_mine(mine)
+            for safe in safes:
+                self.mark_safe(safe)
+            self.infer()
 
     def make_safe_move(self):
         """
@@ -281,17 +516,219 @@ class MinesweeperAI():
         Should choose randomly among cells that:
             1) have not already been chosen, and
             2) are not known to be mines
-        """
-        # Get all possible moves (all cells - moves already made - known mines)
-        possible_moves = set()
-        for i in range(self.height):
-            for j in range(self.width):
-                possible_moves.add((i, j))
-        possible_moves = possible_moves - self.moves_made - self.mines
 
+        Rather than choosing uniformly, the move is chosen randomly among
+        the cells with the lowest probability of being a mine.
+        """
         # If there are no possible moves, return None
-        if len(possible_moves) == 0:
+        if not self.unexplored:
+            return None
+
+        # Choose among the cells least likely to be mines
+        probabilities = self.mine_probabilities()
+        if probabilities is None:
+            return random.choice(tuple(self.unexplored))
+        lowest = min(probabilities.values())
+        best = [
+            cell for cell, p in probabilities.items()
+            if p <= lowest + 1e-12
+        ]
+        return random.choice(best)
+
+    def components(self, sentences=None):
+        """
+        Partitions the knowledge base into components: groups of
+        sentences connected by shared cells. Cells in different components
+        constrain each other only through the total number of mines.
+
+        If `sentences` is given, only the components containing
+        those sentences are returned.
+        """
+        if sentences is None:
+            sentences = self.knowledge
+        components = []
+        seen = set()
+        for sentence in sentences:
+            if sentence in seen or sentence not in self.knowledge:
+                continue
+            seen.add(sentence)
+            component = [sentence]
+            for member in component:
+                for other in self.related_sentences(member):
+                    if other not in seen:
+                        seen.add(other)
+                        component.append(other)
+            components.append(frozenset(component))
+        return components
+
+    def count_configurations(self, component):
+        """
+        Counts the mine configurations of a component's cells that are
+        consistent with all of its sentences.
+
+        Returns a pair (totals, mines), where totals[k] is the number of
+        configurations with k mines, and mines[cell] is a pair (counts, n):
+        counts[k] / n is the number of those configurations in which `cell`
+        is a mine.
+
+        Cells contained in exactly the same sentences are interchangeable,
+        so they are grouped, and only the number of mines in each group is
+        enumerated, weighting each choice by the ways to place those mines.
+        """
+        # Group cells by the sentences they belong to
+        memberships = dict()
+        for sentence in component:
+            for cell in sentence.cells:
+                memberships.setdefault(cell, set()).add(sentence)
+        classes = dict()
+        for cell, sentences in memberships.items():
+            classes.setdefault(frozenset(sentences), []).append(cell)
+
+        # Order groups breadth-first, so sentences are completed early
+        sentence_groups = dict()
+        for group in classes:
+            for sentence in group:
+                sentence_groups.setdefault(sentence, []).append(group)
+        sentences = []
+        order = []
+        for start in component:
+            if start in sentences:
+                continue
+            sentences.append(start)
+            s = len(sentences) - 1
+            while s < len(sentences):
+                for group in sentence_groups[sentences[s]]:
+                    if group in order:
+                        continue
+                    order.append(group)
+                    for other in group:
+                        if other not in sentences:
+                            sentences.append(other)
+                s += 1
+        index = {sentence: s for s, sentence in enumerate(sentences)}
+        members = [[index[sentence] for sentence in group] for group in order]
+        sizes = [len(classes[group]) for group in order]
+        needed = [sentence.count for sentence in sentences]
+        capacity = [len(sentence.cells) for sentence in sentences]
+
+        totals = dict()
+        group_mines = [dict() for _ in order]
+        chosen = [0] * len(order)
+
+        def enumerate_groups(g, weight, total):
+            if g == len(order):
+                totals[total] = totals.get(total, 0) + weight
+                for h, m in enumerate(chosen):
+                    if m:
+                        counts = group_mines[h]
+                        counts[total] = counts.get(total, 0) + weight * m
+                return
+
+            # Choose how many mines the group holds, within every bound
+            size = sizes[g]
+            for s in members[g]:
+                capacity[s] -= size
+            low = max([0] + [needed[s] - capacity[s] for s in members[g]])
+            high = min([size] + [needed[s] for s in members[g]])
+            for m in range(low, high + 1):
+                for s in members[g]:
+                    needed[s] -= m
+                chosen[g] = m
+                enumerate_groups(g + 1, weight * math.comb(size, m), total + m)
+                for s in members[g]:
+                    needed[s] += m
+            chosen[g] = 0
+            for s in members[g]:
+                capacity[s] += size
+
+        enumerate_groups(0, 1, 0)
+
+        # Each cell of a group holds an equal share of the group's mines
+        mines = dict()
+        for group, counts, size in zip(order, group_mines, sizes):
+            for cell in classes[group]:
+                mines[cell] = (counts, size)
+        return totals, mines
+
+    def mine_probabilities(self):
+        """
+        Returns a dictionary mapping every unexplored cell to the
+        probability that it is a mine, given the knowledge base, or
+        None if the knowledge base is inconsistent.
+
+        Components are counted independently (and memoized across moves)
+        and then combined: with the total number of mines known, a
+        configuration placing k mines on the frontier is weighted by the
+        number of ways to place the remaining mines on the other cells.
+        Without it, configurations are weighted equally and unconstrained
+        cells are given the average frontier probability.
+        """
+        components = self.components()
+
+        # Reuse counts of components untouched since the last call
+        counts = dict()
+        for component in components:
+            if component in self.component_counts:
+                counts[component] = self.component_counts[component]
+            else:
+                counts[component] = self.count_configurations(component)
+        self.component_counts = counts
+        totals = [counts[component][0] for component in components]
+
+        # Cells not mentioned by any sentence
+        frontier = set(self.cell_sentences)
+        unconstrained = self.unexplored - frontier - self.safes
+        remaining = None
+        if self.total_mines is not None:
+            remaining = self.total_mines - len(self.mines)
+
+        def combine(distributions):
+            combined = {0: 1}
+            for distribution in distributions:
+                result = dict()
+                for a, x in combined.items():
+                    for b, y in distribution.items():
+                        result[a + b] = result.get(a + b, 0) + x * y
+                combined = result
+            return combined
+
+        def weight(k):
+            if remaining is None:
+                return 1
+            if not 0 <= remaining - k <= len(unconstrained):
+                return 0
+            return math.comb(len(unconstrained), remaining - k)
+
+        # Total weight of all consistent configurations
+        everything = combine(totals)
+        norm = sum(n * weight(k) for k, n in everything.items())
+        if norm == 0:
             return None
 
-        # Otherwise, return a random possible move
-        return random.choice(tuple(possible_moves))
+        probabilities = {cell: 0.0 for cell in self.unexplored & self.safes}
+        for c, component in enumerate(components):
+
+            # Mine counts of every other component combined
+            others = combine(totals[:c] + totals[c + 1:])
+            for cell, (mines, size) in counts[component][1].items():
+                p = 0
+                for k, n in mines.items():
+                    for j, m in others.items():
+                        p += n * m * weight(k + j)
+                probabilities[cell] = p / (norm * size)
+
+        # Remaining mines are spread evenly over unconstrained cells
+        if unconstrained:
+            if remaining is None:
+                p = (sum(probabilities.values()) / len(probabilities)
+                     if probabilities else 0.5)
+            else:
+                expected = sum(
+                    n * weight(k) * (remaining - k)
+                    for k, n in everything.items()
+                )
+                p = expected / norm / len(unconstrained)
+            for cell in unconstrained:
+                probabilities[cell] = p
+
+        return probabilities
@@ -0,0 +1,127 @@
+import multiprocessing
+import random
+import sys
+import time
+
+from minesweeper import Minesweeper, MinesweeperAI
+
+# Number of slices of game progress to report knowledge base size over
+PHASES = 10
+
+
+def main():
+    if len(sys.argv) not in [5, 6, 7]:
+        sys.exit("Usage: python simulate.py games height width mines "
+                 "[solver [processes]]")
+    games, height, width, mines = (int(arg) for arg in sys.argv[1:5])
+    solver = sys.argv[5] if len(sys.argv) >= 6 else "subset"
+    processes = int(sys.argv[6]) if len(sys.argv) == 7 else None
+
+    start = time.perf_counter()
+    results = simulate(games, height, width, mines, solver, processes)
+    elapsed = time.perf_counter() - start
+    report(results, elapsed)
+
+    # Fail like a test suite if the AI ever drew a wrong conclusion
+    unsound = [result["seed"] for result in results if result["unsound"]]
+    if unsound:
+        sys.exit(f"Unsound inference in games with seeds: {unsound}")
+
+
+def simulate(games, height, width, mines, solver="subset", processes=None):
+    """
+    Play `games` seeded games of the given size across a process pool,
+    and return the results of `play_game` for each, ordered by seed.
+    """
+    tasks = [(seed, height, width, mines, solver) for seed in range(games)]
+    with multiprocessing.Pool(processes) as pool:
+        return pool.starmap(play_game, tasks, chunksize=max(1, games // 64))
+
+
+def play_game(seed, height, width, mines, solver="subset"):
+    """
+    Play a single game with board and AI randomness seeded by `seed`,
+    with the AI using the given solver.
+
+    Return a dictionary with the outcome, the seconds spent in each move,
+    the knowledge base size after each move, and whether the AI ever
+    concluded something that contradicts the board.
+    """
+    random.seed(seed)
+    game = Minesweeper(height, width, mines)
+    ai = MinesweeperAI(height, width, mines, solver)
+    won, moves = play(game, ai)
+    return {
+        "seed": seed,
+        "won": won,
+        "latencies": [latency for latency, _ in moves],
+        "sizes": [size for _, size in moves],
+        "unsound": bool(ai.mines - game.mines or ai.safes & game.mines)
+    }
+
+
+def play(game, ai):
+    """
+    Play a full game without a display, always taking a safe move
+    when one is known.
+
+    Return whether the game was won, and a list of
+    (seconds spent in the move, knowledge base size) for each move.
+    """
+    moves = []
+    remaining = game.height * game.width - len(game.mines)
+    while remaining:
+        start = time.perf_counter()
+        move = ai.make_safe_move()
+        if move is None:
+            move = ai.make_random_move()
+            if move is None:
+                break
+        if game.is_mine(move):
+            return False, moves
+        ai.add_knowledge(move, game.nearby_mines(move))
+        moves.append((time.perf_counter() - start, len(ai.knowledge)))
+        remaining -= 1
+    return remaining == 0, moves
+
+
+def report(results, elapsed):
+    """
+    Print win rate, throughput, latency percentiles, and knowledge
+    base size over the course of the games.
+    """
+    games = len(results)
+    wins = sum(result["won"] for result in results)
+    latencies = sorted(
+        latency for result in results for latency in result["latencies"]
+    )
+
+    print(f"Games: {games}, won {wins} ({100 * wins / games:.1f}%)")
+    print(f"  Moves: {len(latencies)} ({len(latencies) / elapsed:.0f} per second)")
+    if latencies:
+        print(f"  Mean latency: {1000 * sum(latencies) / len(latencies):.3f} ms")
+        for p in [50, 90, 99]:
+            print(f"  p{p} latency: {1000 * percentile(latencies, p):.3f} ms")
+        print(f"  Max latency: {1000 * latencies[-1]:.3f} ms")
+
+    # Knowledge base size by how far each game had progressed
+    print("  Mean knowledge size by game progress:")
+    phases = [[] for _ in range(PHASES)]
+    for result in results:
+        sizes = result["sizes"]
+        for move, size in enumerate(sizes):
+            phases[move * PHASES // len(sizes)].append(size)
+    for phase, sizes in enumerate(phases):
+        if sizes:
+            print(f"    {100 * phase // PHASES:>3}%: {sum(sizes) / len(sizes):.1f} sentences")
+
+
+def percentile(values, p):
+    """
+    Return the `p`th percentile of a sorted list of values.
+    """
+    return values[min(len(values) - 1, len(values) * p // 100)]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import csv
+import json
+import multiprocessing
+import os
+import sys
+
+from heredity import MODES, inheritance_table, load_data
+
+# Modes that sample across a process pool of their own, so are run on
+# one family file at a time rather than inside another pool
+SAMPLING_MODES = ["likelihood", "gibbs"]
+
+
+def main():
+    if len(sys.argv) not in [3, 4, 5]:
+        sys.exit("Usage: python batch.py directory "
+                 "(output.jsonl | output.csv) [mode [processes]]")
+    directory, output = sys.argv[1:3]
+    mode = sys.argv[3] if len(sys.argv) >= 4 else "elimination"
+    processes = int(sys.argv[4]) if len(sys.argv) == 5 else None
+    if mode not in MODES:
+        sys.exit(f"Mode must be one of: {', '.join(MODES)}")
+    if not output.endswith((".jsonl", ".csv")):
+        sys.exit("Output must be a .jsonl or .csv file")
+
+    filenames = sorted(
+        os.path.join(directory, filename)
+        for filename in os.listdir(directory) if filename.endswith(".csv")
+    )
+    families = 0
+    with open(output, "w", newline="") as f:
+        write = jsonl_writer(f) if output.endswith(".jsonl") else csv_writer(f)
+        for filename, probabilities in solve(filenames, mode, processes):
+            write(os.path.relpath(filename, directory), probabilities)
+            families += 1
+    print(f"Wrote probabilities for {families} families to {output}")
+
+
+def solve(filenames, mode, processes=None):
+    """
+    Yield (filename, probabilities) for each family file, in order,
+    computing probabilities with `mode` across a pool of `processes`.
+    """
+    # Compute the inheritance table once, before worker processes start
+    inheritance_table()
+
+    tasks = [(filename, mode) for filename in filenames]
+    if mode in SAMPLING_MODES:
+        yield from map(solve_file, tasks)
+        return
+    with multiprocessing.Pool(processes) as pool:
+        chunksize = max(1, len(tasks) // (4 * (processes or os.cpu_count())))
+        yield from pool.imap(solve_file, tasks, chunksize=chunksize)
+
+
+def solve_file(task):
+    """
+    Return a (filename, probabilities) pair for a (filename, mode) task.
+    """
+    filename, mode = task
+    return filename, MODES[mode](load_data(filename))
+
+
+def jsonl_writer(f):
+    """
+    Return a function writing one family's probabilities to `f` as a
+    line of JSON, keyed by family and then by person.
+    """
+    def write(family, probabilities):
+        f.write(json.dumps({"family": family, "people": probabilities}) + "\n")
+    return write
+
+
+def csv_writer(f):
+    """
+    Return a function writing one family's probabilities to `f` as CSV,
+    with one row per person.
+    """
+    writer = csv.writer(f)
+    writer.writerow(["family", "name", "gene_2", "gene_1", "gene_0",
+                     "trait_true", "trait_false"])
+
+    def write(family, probabilities):
+        for person, p in probabilities.items():
+            writer.writerow([
+                family, person, p["gene"][2], p["gene"][1], p["gene"][0],
+                p["trait"][True], p["trait"][False]
+            ])
+    return write
+
+
+if __name__ == "__main__":
+    main()
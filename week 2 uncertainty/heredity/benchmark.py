@@ -0,0 +1,125 @@
+import sys
+import time
+
+from generate import generate_pedigree
+from heredity import MODES, load_data, pruned_families
+
+# Families as (depth, width, inbreeding), smallest first
+FAMILIES = [
+    (2, 2, 0), (2, 3, 0), (3, 2, 0), (3, 2, 1),
+    (4, 4, 0), (6, 10, 0), (6, 10, 0.3), (10, 50, 0), (20, 200, 0)
+]
+
+# Largest family (or, for "pruned", largest number of people whose genes
+# it enumerates in one family) each exponential mode is run on
+LIMITS = {
+    "enumerate": 7,
+    "batched": 10,
+    "pruned": 12
+}
+
+# Time budget of each sampling mode, in seconds
+SECONDS = 5
+
+# Largest difference from the "elimination" mode's probabilities allowed
+# for exact modes, and number of standard errors allowed for sampling
+# modes, beyond a difference of SAMPLED_MARGIN
+EXACT_AGREEMENT = 1e-9
+SAMPLED_AGREEMENT = 6
+SAMPLED_MARGIN = 0.01
+
+# Largest R-hat of Gibbs sampling chains, and smallest effective sample
+# size of likelihood weighting, considered converged: beyond them, the
+# sampled probabilities are not checked
+R_HAT_LIMIT = 1.1
+ESS_LIMIT = 100
+
+
+def main():
+    if len(sys.argv) > 1:
+        sys.exit("Usage: python benchmark.py")
+
+    disagreements = []
+    for filename in ["data/family0.csv", "data/family1.csv", "data/family2.csv"]:
+        disagreements += benchmark(filename, load_data(filename))
+    for depth, width, inbreeding in FAMILIES:
+        people = generate_pedigree(depth, width, inbreeding=inbreeding, seed=0)
+        name = f"depth {depth}, width {width}, inbreeding {inbreeding}"
+        disagreements += benchmark(name, people)
+
+    # Fail like a test suite if any mode disagrees with the exact probabilities
+    if disagreements:
+        sys.exit(f"Probabilities disagree: {disagreements}")
+
+
+def benchmark(name, people):
+    """
+    Time every mode able to handle `people` in reasonable time, printing
+    each one's largest difference from the "elimination" mode's
+    probabilities. Return a list of the modes that disagree with it.
+    """
+    known = sum(people[person]["trait"] is not None for person in people)
+    print(f"{name} ({len(people)} people, {known} traits known)")
+    exact, elapsed = timed(MODES["elimination"], people)
+    print(f"  {'elimination':<12} {1000 * elapsed:10.1f} ms")
+
+    disagreements = []
+    for mode, function in MODES.items():
+        if mode == "elimination" or too_large(mode, people):
+            continue
+        diagnostics = dict()
+        if mode in ["likelihood", "gibbs"]:
+            probabilities, elapsed = timed(function, people, seconds=SECONDS,
+                                           seed=0, diagnostics=diagnostics)
+            allowed = (SAMPLED_AGREEMENT * diagnostics["error"]
+                       + SAMPLED_MARGIN)
+        else:
+            probabilities, elapsed = timed(function, people)
+            allowed = EXACT_AGREEMENT
+
+        difference = max(
+            abs(probabilities[person][field][value] - exact[person][field][value])
+            for person in people
+            for field in exact[person]
+            for value in exact[person][field]
+        )
+        details = ""
+        if diagnostics:
+            details = f"  {diagnostics['samples']} samples"
+            if "r_hat" in diagnostics:
+                details += f", R-hat {diagnostics['r_hat']:.3f}"
+            if "ess" in diagnostics:
+                details += f", ESS {diagnostics['ess']:.1f}"
+        if (diagnostics.get("r_hat", 1) > R_HAT_LIMIT
+                or diagnostics.get("ess", ESS_LIMIT) < ESS_LIMIT):
+            details += "  not converged"
+        elif difference > allowed:
+            details += "  DISAGREES"
+            disagreements.append(f"{name}: {mode}")
+        print(f"  {mode:<12} {1000 * elapsed:10.1f} ms"
+              f"  max difference {difference:.2e}{details}")
+    return disagreements
+
+
+def too_large(mode, people):
+    """
+    Return whether `people` is too large a family to run `mode` on.
+    """
+    if mode == "pruned":
+        largest = max(len(enumerated) for enumerated, _ in pruned_families(people))
+        return largest > LIMITS[mode]
+    return len(people) > LIMITS.get(mode, len(people))
+
+
+def timed(function, *args, **kwargs):
+    """
+    Return the result of calling `function` with the given arguments,
+    and the number of seconds the call took.
+    """
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import csv
+import random
+import sys
+
+from heredity import PROBS
+
+# Fraction of people whose trait is known
+EVIDENCE = 0.5
+
+# Fraction of couples made up of two members of the same generation,
+# rather than one member and a spouse from outside the family; any such
+# couple gives the family a loop
+INBREEDING = 0
+
+
+def main():
+    if len(sys.argv) not in [5, 6]:
+        sys.exit("Usage: python generate.py depth width evidence data.csv [seed]")
+    depth, width = int(sys.argv[1]), int(sys.argv[2])
+    evidence = float(sys.argv[3])
+    seed = int(sys.argv[5]) if len(sys.argv) == 6 else None
+
+    people = generate_pedigree(depth, width, evidence, seed=seed)
+    write_csv(people, sys.argv[4])
+    print(f"Generated {len(people)} people in {sys.argv[4]}")
+
+
+def generate_pedigree(depth, width, evidence=EVIDENCE, inbreeding=INBREEDING,
+                      seed=None):
+    """
+    Return a family of `depth` generations of `width` people each, as a
+    dictionary in the format of `heredity.load_data`.
+
+    Each member of a generation before the last forms a couple with a
+    spouse (a person with no parents listed), or with probability
+    `inbreeding` with another member of their generation. Every member of
+    the next generation is a child of a couple chosen at random.
+
+    Genes and traits are drawn according to PROBS, and each person's
+    trait is known with probability `evidence`.
+    """
+    rng = random.Random(seed)
+    people = dict()
+    genes = dict()
+
+    def add(name, mother=None, father=None):
+        if mother is None:
+            copies = rng.choices([0, 1, 2],
+                                 weights=[PROBS["gene"][n] for n in range(3)])[0]
+        else:
+            copies = sum(passes_gene(rng, genes[parent])
+                         for parent in [mother, father])
+        genes[name] = copies
+        trait = rng.random() < PROBS["trait"][copies][True]
+        people[name] = {
+            "name": name,
+            "mother": mother,
+            "father": father,
+            "trait": trait if rng.random() < evidence else None
+        }
+
+    generation = [f"g0_{i}" for i in range(width)]
+    for name in generation:
+        add(name)
+    for g in range(1, depth):
+        # Pair each member of the previous generation up
+        couples = []
+        single = list(generation)
+        rng.shuffle(single)
+        while single:
+            member = single.pop()
+            if single and rng.random() < inbreeding:
+                couples.append((member, single.pop()))
+            else:
+                spouse = f"s{g}_{len(couples)}"
+                add(spouse)
+                couples.append((member, spouse))
+
+        generation = [f"g{g}_{i}" for i in range(width)]
+        for name in generation:
+            add(name, *rng.choice(couples))
+    return people
+
+
+def passes_gene(rng, copies):
+    """
+    Return whether a parent with `copies` copies of the gene passes
+    one on to a child, including mutation.
+    """
+    passes = {0: PROBS["mutation"], 1: 0.5, 2: 1 - PROBS["mutation"]}[copies]
+    return rng.random() < passes
+
+
+def write_csv(people, filename):
+    """
+    Write a family to `filename` in the CSV format read by
+    `heredity.load_data`.
+    """
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "mother", "father", "trait"])
+        for person in people.values():
+            trait = "" if person["trait"] is None else int(person["trait"])
+            writer.writerow([person["name"], person["mother"] or "",
+                             person["father"] or "", trait])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,16 @@
 import csv
+import functools
+import heapq
 import itertools
+import math
+import multiprocessing
+import os
 import sys
+import time
+
+from collections import namedtuple
+
+import numpy as np
 
 PROBS = {
 
@@ -36,15 +46,73 @@ PROBS = {
     "mutation": 0.01
 }
 
+# Number of assignments whose joint probability is computed at once
+BATCH_SIZE = 1 << 14
+
+# Number of gene assignments drawn by the sampling modes, over all chains
+SAMPLES = 100_000
+
+# Number of assignments each Gibbs sampling chain updates together, and
+# number of sweeps over everyone each chain discards before counting
+WALKERS = 100
+BURN_IN = 100
+
+# A table of probabilities indexed by the number of copies of the gene of
+# each of `variables`, the names of people, in order
+Factor = namedtuple("Factor", ["variables", "table"])
+
 
 def main():
 
     # Check for proper usage
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python heredity.py data.csv")
+    if len(sys.argv) not in [2, 3]:
+        sys.exit("Usage: python heredity.py data.csv [mode]")
+    mode = sys.argv[2] if len(sys.argv) == 3 else "enumerate"
+    if mode not in MODES:
+        sys.exit(f"Mode must be one of: {', '.join(MODES)}")
     people = load_data(sys.argv[1])
 
     # Keep track of gene and trait probabilities for each person
+    diagnostics = dict()
+    if mode in ["likelihood", "gibbs"]:
+        probabilities = MODES[mode](people, diagnostics=diagnostics)
+    else:
+        probabilities = MODES[mode](people)
+
+    # Print results
+    for person in people:
+        print(f"{person}:")
+        for field in probabilities[person]:
+            print(f"  {field.capitalize()}:")
+            for value in probabilities[person][field]:
+                p = probabilities[person][field][value]
+                print(f"    {value}: {p:.4f}")
+    if mode == "pruned":
+        pruned, full = evaluations(people)
+        print(f"Joint probability evaluations: {pruned} "
+              f"(saved {full - pruned} of {full})")
+    if diagnostics:
+        print(f"Samples: {diagnostics['samples']} "
+              f"from {diagnostics['chains']} chains")
+        print(f"Max standard error: {diagnostics['error']:.4f}")
+        if "r_hat" in diagnostics:
+            print(f"Max R-hat: {diagnostics['r_hat']:.4f}")
+        if "ess" in diagnostics:
+            per_chain = ", ".join(f"{ess:.1f}" for ess in diagnostics["chain_ess"])
+            print(f"Min effective sample size: {diagnostics['ess']:.1f} "
+                  f"(per chain: {per_chain})")
+
+
+def enumerate_probabilities(people):
+    """
+    Return the gene and trait probability distributions of each person,
+    by summing the joint probability of every assignment of genes and
+    traits that agrees with the known traits.
+
+    Joint probabilities are computed as logarithms, and summed relative
+    to `scale`, the largest log joint probability so far, so that they
+    cannot underflow to 0 for large families.
+    """
     probabilities = {
         person: {
             "gene": {
@@ -59,6 +127,7 @@ def main():
         }
         for person in people
     }
+    scale = -math.inf
 
     # Loop over all sets of people who might have the trait
     names = set(people)
@@ -78,20 +147,16 @@ def main():
             for two_genes in powerset(names - one_gene):
 
                 # Update probabilities with new joint probability
-                p = joint_probability(people, one_gene, two_genes, have_trait)
-                update(probabilities, one_gene, two_genes, have_trait, p)
+                log_p = log_joint_probability(people, one_gene, two_genes,
+                                              have_trait)
+                if log_p > scale:
+                    rescale(probabilities, math.exp(scale - log_p))
+                    scale = log_p
+                update(probabilities, one_gene, two_genes, have_trait,
+                       math.exp(log_p - scale))
 
     # Ensure probabilities sum to 1
-    normalize(probabilities)
-
-    # Print results
-    for person in people:
-        print(f"{person}:")
-        for field in probabilities[person]:
-            print(f"  {field.capitalize()}:")
-            for value in probabilities[person][field]:
-                p = probabilities[person][field][value]
-                print(f"    {value}: {p:.4f}")
+    return normalize(probabilities)
 
 
 def load_data(filename):
@@ -118,14 +183,13 @@ def load_data(filename):
 
 def powerset(s):
     """
-    Return a list of all possible subsets of set s.
+    Yield all possible subsets of set s.
     """
     s = list(s)
-    return [
-        set(s) for s in itertools.chain.from_iterable(
-            itertools.combinations(s, r) for r in range(len(s) + 1)
-        )
-    ]
+    for subset in itertools.chain.from_iterable(
+        itertools.combinations(s, r) for r in range(len(s) + 1)
+    ):
+        yield set(subset)
 
 
 def joint_probability(people, one_gene, two_genes, have_trait):
@@ -199,6 +263,11 @@ def normalize(probabilities):
         for field in ['gene', 'trait']:
 
             summed = sum(probabilities[person][field].values())
+            if not summed > 0:
+                raise ValueError(
+                    f"{field} probabilities of {person} sum to {summed}, "
+                    "so cannot be normalized"
+                )
 
             for value in probabilities[person][field]:
                 normalized[person][field][value] /= summed
@@ -206,5 +275,895 @@ def normalize(probabilities):
     return normalized
 
 
+def log_joint_probability(people, one_gene, two_genes, have_trait):
+    """
+    Return the natural logarithm of `joint_probability`, computed as the
+    sum of the logarithms of its factors, so that it cannot underflow.
+    """
+    log_gene, log_inheritance, log_trait = log_tables()
+    log_probability = 0
+    for person in people:
+        genes = 1 if person in one_gene else 2 if person in two_genes else 0
+        log_probability += log_trait[genes][person in have_trait]
+
+        mother, father = people[person]["mother"], people[person]["father"]
+        if mother is None and father is None:
+            log_probability += log_gene[genes]
+        else:
+            mother_genes = 1 if mother in one_gene else 2 if mother in two_genes else 0
+            father_genes = 1 if father in one_gene else 2 if father in two_genes else 0
+            log_probability += log_inheritance[mother_genes][father_genes][genes]
+    return log_probability
+
+
+def rescale(probabilities, factor):
+    """
+    Multiply every probability in `probabilities` by `factor`.
+    """
+    for person in probabilities:
+        for field in probabilities[person]:
+            for value in probabilities[person][field]:
+                probabilities[person][field][value] *= factor
+
+
+@functools.lru_cache(maxsize=None)
+def log_tables():
+    """
+    Return the natural logarithms of the unconditional gene probabilities,
+    of `inheritance_table`, and of the trait probabilities indexed by
+    number of genes and trait (0 or 1), as nested lists for fast lookup.
+    """
+    log_gene = [math.log(PROBS["gene"][n]) for n in range(3)]
+    log_inheritance = np.log(inheritance_table()).tolist()
+    log_trait = [
+        [math.log(PROBS["trait"][n][False]), math.log(PROBS["trait"][n][True])]
+        for n in range(3)
+    ]
+    return log_gene, log_inheritance, log_trait
+
+
+def elimination_probabilities(people):
+    """
+    Return the gene and trait probability distributions of each person,
+    computed exactly by message passing over a junction tree of the
+    family's Bayesian network. For families shaped like a tree, this
+    takes time linear in the number of people.
+    """
+    marginals = gene_marginals(gene_factors(people))
+    probabilities = dict()
+    for person in people:
+        gene = marginals[person]
+        trait = people[person]["trait"]
+        if trait is None:
+            have_trait = sum(gene[n] * PROBS["trait"][n][True] for n in range(3))
+        else:
+            have_trait = 1.0 if trait else 0.0
+        probabilities[person] = {
+            "gene": {n: float(gene[n]) for n in [2, 1, 0]},
+            "trait": {True: have_trait, False: 1 - have_trait}
+        }
+    return probabilities
+
+
+def pruned_probabilities(people, batch_size=BATCH_SIZE):
+    """
+    Return the gene and trait probability distributions of each person,
+    like `enumerate_probabilities`, but enumerating only what the
+    evidence leaves open: families with no one in common are enumerated
+    separately, known traits are fixed, and unknown traits are summed
+    out rather than enumerated.
+
+    Only the people chosen by `pruned_families` have their genes
+    enumerated, `batch_size` assignments at a time. Everyone else has no
+    evidence of their own or among their descendants, so they leave the
+    others' probabilities unchanged: their gene distributions are pushed
+    forward from their parents' through `inheritance_table` instead,
+    given each assignment. Families with no evidence at all are pushed
+    forward from the unconditional probabilities, enumerating nobody
+    unless some parents share ancestors.
+
+    Sums are kept relative to `scale`, the largest log probability of a
+    family's assignments so far, so that they cannot all underflow to 0.
+    """
+    log_gene, log_inheritance, log_trait = (
+        np.array(table) for table in log_tables()
+    )
+    inheritance = inheritance_table()
+    prior = np.array([PROBS["gene"][n] for n in range(3)])
+
+    gene_sums = dict()
+    for enumerated, pushed in pruned_families(people):
+        index = {person: i for i, person in enumerate(enumerated)}
+        sums = np.zeros((len(enumerated) + len(pushed), 3))
+        scale = -np.inf
+        total = 3 ** len(enumerated)
+        for start in range(0, total, batch_size):
+            codes = np.arange(start, min(start + batch_size, total),
+                              dtype=np.int64)
+            genes = np.empty((len(codes), len(enumerated)), dtype=np.int64)
+            for i in range(len(enumerated)):
+                codes, genes[:, i] = np.divmod(codes, 3)
+
+            # Joint probability of the genes and known traits of everyone
+            # enumerated, for each assignment
+            log_p = np.zeros(len(genes))
+            for i, person in enumerate(enumerated):
+                mother, father = people[person]["mother"], people[person]["father"]
+                if mother is None:
+                    log_p += log_gene[genes[:, i]]
+                else:
+                    log_p += log_inheritance[
+                        genes[:, index[mother]], genes[:, index[father]], genes[:, i]
+                    ]
+                trait = people[person]["trait"]
+                if trait is not None:
+                    log_p += log_trait[genes[:, i], int(trait)]
+            if log_p.max() > scale:
+                sums *= np.exp(scale - log_p.max())
+                scale = log_p.max()
+            p = np.exp(log_p - scale)
+            for i in range(len(enumerated)):
+                sums[i] += np.bincount(genes[:, i], weights=p, minlength=3)
+
+            # Gene distribution of everyone else, given each assignment.
+            # Distributions that are the same for every assignment, like
+            # those of people descended from no one enumerated, have one row
+            distributions = dict()
+            for i, person in enumerate(pushed, start=len(enumerated)):
+                mother, father = people[person]["mother"], people[person]["father"]
+                if mother is None:
+                    distribution = prior[np.newaxis]
+                elif mother in index and father in index:
+                    distribution = inheritance[
+                        genes[:, index[mother]], genes[:, index[father]]
+                    ]
+                else:
+                    m, f = (
+                        distributions[parent] if parent in distributions
+                        else np.eye(3)[genes[:, index[parent]]]
+                        for parent in [mother, father]
+                    )
+                    distribution = (
+                        (m[:, :, np.newaxis] * f[:, np.newaxis, :]).reshape(-1, 9)
+                        @ inheritance.reshape(9, 3)
+                    )
+                distributions[person] = distribution
+                sums[i] += p @ np.broadcast_to(distribution, (len(p), 3))
+
+        sums /= sums.sum(axis=1, keepdims=True)
+        gene_sums.update(zip(enumerated + pushed, sums))
+
+    probabilities = dict()
+    for person in people:
+        gene = gene_sums[person]
+        trait = people[person]["trait"]
+        if trait is None:
+            have_trait = sum(gene[n] * PROBS["trait"][n][True] for n in range(3))
+        else:
+            have_trait = 1.0 if trait else 0.0
+        probabilities[person] = {
+            "gene": {n: float(gene[n]) for n in [2, 1, 0]},
+            "trait": {True: float(have_trait), False: float(1 - have_trait)}
+        }
+    return probabilities
+
+
+def pruned_families(people):
+    """
+    Return a pair of lists of names (enumerated, pushed) for each family
+    in `components(people)`, each with parents before their children:
+    the people whose genes `pruned_probabilities` enumerates, and the
+    people whose gene distributions it pushes forward from their parents'.
+
+    Everyone with a known trait, or with a descendant with a known trait,
+    is enumerated. So are any ancestors shared by the parents of someone
+    not enumerated (and their own ancestors), as otherwise those parents'
+    genes would not be independent given the assignment, and could not
+    be pushed forward separately.
+    """
+    children = {person: [] for person in people}
+    for person in people:
+        for parent in [people[person]["mother"], people[person]["father"]]:
+            if parent is not None:
+                children[parent].append(person)
+    order = parents_first(people)
+
+    enumerated = set()
+    for person in reversed(order):
+        if (people[person]["trait"] is not None
+                or any(child in enumerated for child in children[person])):
+            enumerated.add(person)
+
+    # Everyone not enumerated that each person descends from (or is)
+    ancestors = dict()
+    for person in order:
+        if person in enumerated:
+            continue
+        mother, father = people[person]["mother"], people[person]["father"]
+        if mother is None:
+            ancestors[person] = {person}
+            continue
+        maternal = ancestors.get(mother, set()) - enumerated
+        paternal = ancestors.get(father, set()) - enumerated
+        for shared in maternal & paternal:
+            enumerated |= ancestors[shared]
+        ancestors[person] = ({person} | maternal | paternal) - enumerated
+
+    families = []
+    for component in components(people):
+        members = set(component)
+        family = [person for person in order if person in members]
+        families.append((
+            [person for person in family if person in enumerated],
+            [person for person in family if person not in enumerated]
+        ))
+    return families
+
+
+def parents_first(people):
+    """
+    Return a list of the names in `people`, with everyone's parents
+    before them.
+    """
+    order = []
+    placed = set()
+    for person in people:
+        stack = [person]
+        while stack:
+            current = stack[-1]
+            if current in placed:
+                stack.pop()
+                continue
+            parents = [
+                parent
+                for parent in [people[current]["mother"], people[current]["father"]]
+                if parent is not None and parent not in placed
+            ]
+            if parents:
+                stack.extend(parents)
+            else:
+                stack.pop()
+                placed.add(current)
+                order.append(current)
+    return order
+
+
+def components(people):
+    """
+    Return a list of the families in `people` that have no one in common,
+    each as a list of names: people are in the same family if one is a
+    parent of the other, or both are in the same family as someone else.
+    """
+    relatives = {person: set() for person in people}
+    for person in people:
+        for parent in [people[person]["mother"], people[person]["father"]]:
+            if parent is not None:
+                relatives[person].add(parent)
+                relatives[parent].add(person)
+
+    components = []
+    seen = set()
+    for person in people:
+        if person in seen:
+            continue
+        seen.add(person)
+        component = [person]
+        for member in component:
+            for relative in relatives[member] - seen:
+                seen.add(relative)
+                component.append(relative)
+        components.append(component)
+    return components
+
+
+def evaluations(people):
+    """
+    Return the number of joint probabilities computed by
+    `pruned_probabilities` and by `enumerate_probabilities` for `people`.
+    """
+    unknown = sum(people[person]["trait"] is None for person in people)
+    pruned = sum(
+        3 ** len(enumerated)
+        for enumerated, _ in pruned_families(people) if enumerated
+    )
+    return pruned, 3 ** len(people) * 2 ** unknown
+
+
+def batched_probabilities(people, batch_size=BATCH_SIZE):
+    """
+    Return the gene and trait probability distributions of each person,
+    like `enumerate_probabilities`, but computing the joint probabilities
+    of `batch_size` assignments at a time with NumPy.
+
+    Sums are kept relative to `scale`, the largest log joint probability
+    so far, so that they cannot all underflow to 0.
+    """
+    names = list(people)
+    index = {name: i for i, name in enumerate(names)}
+    mothers = np.array([index.get(people[name]["mother"], -1) for name in names])
+    fathers = np.array([index.get(people[name]["father"], -1) for name in names])
+    tables = tuple(np.array(table) for table in log_tables())
+
+    gene_sums = np.zeros((len(names), 3))
+    trait_sums = np.zeros((len(names), 2))
+    scale = -np.inf
+    for genes, traits in assignments(people, batch_size):
+        log_p = log_joint_probabilities(genes, traits, mothers, fathers, tables)
+        if log_p.max() > scale:
+            rescale = np.exp(scale - log_p.max())
+            gene_sums *= rescale
+            trait_sums *= rescale
+            scale = log_p.max()
+        p = np.exp(log_p - scale)
+        for i in range(len(names)):
+            gene_sums[i] += np.bincount(genes[:, i], weights=p, minlength=3)
+            trait_sums[i] += np.bincount(traits[:, i], weights=p, minlength=2)
+
+    gene_sums /= gene_sums.sum(axis=1, keepdims=True)
+    trait_sums /= trait_sums.sum(axis=1, keepdims=True)
+    return {
+        name: {
+            "gene": {n: float(gene_sums[i, n]) for n in [2, 1, 0]},
+            "trait": {True: float(trait_sums[i, 1]),
+                      False: float(trait_sums[i, 0])}
+        }
+        for i, name in enumerate(names)
+    }
+
+
+def assignments(people, batch_size=BATCH_SIZE):
+    """
+    Yield every assignment of genes and traits that agrees with the known
+    traits, `batch_size` at a time, as a pair of integer arrays with one
+    row per assignment and one column per person: number of copies of
+    the gene, and 1 for having the trait or 0 otherwise.
+    """
+    known = [people[person]["trait"] for person in people]
+    unknown = [i for i, trait in enumerate(known) if trait is None]
+    fixed = np.array([int(bool(trait)) for trait in known])
+
+    # Assignments are numbered in base 3 for genes, then base 2 for
+    # unknown traits
+    total = 3 ** len(known) * 2 ** len(unknown)
+    for start in range(0, total, batch_size):
+        codes = np.arange(start, min(start + batch_size, total), dtype=np.int64)
+        genes = np.empty((len(codes), len(known)), dtype=np.int64)
+        for i in range(len(known)):
+            codes, genes[:, i] = np.divmod(codes, 3)
+        traits = np.tile(fixed, (len(codes), 1))
+        for i in unknown:
+            codes, traits[:, i] = np.divmod(codes, 2)
+        yield genes, traits
+
+
+def log_joint_probabilities(genes, traits, mothers, fathers, tables):
+    """
+    Return the logarithm of the joint probability of each assignment
+    (row) of `genes` and `traits`, as given by `assignments`.
+
+    `mothers` and `fathers` hold the column of each person's parents, or
+    -1 for people with no parents listed, and `tables` holds the arrays
+    of `log_tables`.
+    """
+    log_gene, log_inheritance, log_trait = tables
+    founders = mothers < 0
+    log_probabilities = np.where(
+        founders,
+        log_gene[genes],
+        log_inheritance[genes[:, mothers], genes[:, fathers], genes]
+    )
+    log_probabilities += log_trait[genes, traits]
+    return log_probabilities.sum(axis=1)
+
+
+def likelihood_probabilities(people, samples=SAMPLES, seconds=None,
+                             chains=None, seed=None, diagnostics=None):
+    """
+    Return the gene and trait probability distributions of each person,
+    estimated by likelihood weighting: genes are drawn from parents to
+    children, and each draw is weighted by the probability of the known
+    traits given its genes. Families with no one in common are weighted
+    separately, by their own known traits only.
+
+    Sampling runs `chains` independent chains across a process pool, and
+    stops after `samples` draws in all, or after `seconds` if given. If a
+    `diagnostics` dictionary is given, it is filled in with the number
+    of samples and chains, and the largest standard error of any
+    probability (from the spread of the chains' estimates). It also gets
+    the smallest Kish effective sample size, (sum of weights) ** 2 / sum
+    of squared weights, of any family over all chains ("ess") and within
+    each chain ("chain_ess"): when a few draws carry almost all the
+    weight, it is far below the number of samples and the estimates
+    (and their standard error) cannot be trusted.
+    """
+    return sample_probabilities(people, "likelihood", samples, seconds,
+                                chains, seed, diagnostics)
+
+
+def gibbs_probabilities(people, samples=SAMPLES, seconds=None, chains=None,
+                        seed=None, diagnostics=None):
+    """
+    Return the gene and trait probability distributions of each person,
+    estimated by Gibbs sampling: each person's genes are redrawn in turn
+    given everyone else's genes and the known traits.
+
+    Sampling runs `chains` independent chains across a process pool, as
+    in `likelihood_probabilities`, and `diagnostics` also gets the
+    largest potential scale reduction factor (R-hat) of any probability,
+    which is close to 1 once the chains have converged.
+    """
+    return sample_probabilities(people, "gibbs", samples, seconds, chains,
+                                seed, diagnostics)
+
+
+def sample_probabilities(people, method, samples, seconds, chains, seed,
+                         diagnostics):
+    """
+    Run chains of the sampling `method` ("likelihood" or "gibbs") across
+    a process pool, and combine their estimates into the gene and trait
+    probability distributions of each person.
+    """
+    names = list(people)
+    chains = chains or max(2, os.cpu_count())
+    processes = min(chains, os.cpu_count())
+
+    # Split the budget between chains, which run `processes` at a time
+    if seconds is not None:
+        seconds = seconds * processes / chains
+    tasks = [
+        (method, child, -(-samples // chains), seconds)
+        for child in np.random.SeedSequence(seed).spawn(chains)
+    ]
+    with multiprocessing.Pool(processes, initializer=start_sampler_worker,
+                              initargs=(people,)) as pool:
+        results = pool.map(run_chain, tasks)
+
+    # Each chain's estimates and number of samples
+    genes = np.array([result["genes"] for result in results])
+    traits = np.array([result["traits"] for result in results])
+    drawn = np.array([result["samples"] for result in results])
+    if method == "likelihood":
+        # Chains' estimates for each family are weighted by their total
+        # weight for the family, with weights on a common scale
+        scales = np.array([result["scale"] for result in results])
+        rescale = np.exp(scales - scales.max(axis=0))
+        weights = np.array([result["weight"] for result in results]) * rescale
+        squared = np.array([result["squared"] for result in results]) * rescale ** 2
+
+        # Kish effective sample size of each family, within each chain
+        # and over all chains
+        chain_ess = weights ** 2 / squared
+        ess = weights.sum(axis=0) ** 2 / squared.sum(axis=0)
+
+        weights /= weights.sum(axis=0)
+        weights = weights[:, results[0]["family"]]
+    else:
+        weights = np.repeat(drawn[:, np.newaxis] / drawn.sum(), len(names), axis=1)
+    gene = (weights[:, :, np.newaxis] * genes).sum(axis=0)
+    trait = (weights * traits).sum(axis=0)
+
+    if diagnostics is not None:
+        diagnostics["samples"] = int(drawn.sum())
+        diagnostics["chains"] = chains
+        diagnostics["error"] = float(genes.std(axis=0, ddof=1).max()
+                                     / np.sqrt(chains))
+        if method == "gibbs":
+            diagnostics["r_hat"] = r_hat(results)
+        else:
+            diagnostics["ess"] = float(ess.min())
+            diagnostics["chain_ess"] = chain_ess.min(axis=1).tolist()
+
+    probabilities = dict()
+    for i, person in enumerate(names):
+        known = people[person]["trait"]
+        have_trait = float(trait[i]) if known is None else float(known)
+        probabilities[person] = {
+            "gene": {n: float(gene[i, n]) for n in [2, 1, 0]},
+            "trait": {True: have_trait, False: 1 - have_trait}
+        }
+    return probabilities
+
+
+def r_hat(results):
+    """
+    Return the largest potential scale reduction factor of any gene
+    probability, from each Gibbs chain's mean and variance over sweeps.
+    """
+    sweeps = min(result["samples"] // WALKERS for result in results)
+    if sweeps < 2:
+        return math.inf
+    means = np.array([result["genes"] for result in results])
+    variances = np.array([result["variances"] for result in results])
+    within = variances.mean(axis=0)
+    between = sweeps * means.var(axis=0, ddof=1)
+    pooled = (sweeps - 1) / sweeps * within + between / sweeps
+    ratios = np.ones_like(within)
+    spread = within > 0
+    ratios[spread] = np.sqrt(pooled[spread] / within[spread])
+    return float(ratios.max())
+
+
+# State of each worker process of `sample_probabilities`
+sampler_worker = dict()
+
+
+def start_sampler_worker(people):
+    """
+    Set up a worker process of `sample_probabilities` with the arrays
+    describing `people` that sampling chains work from.
+    """
+    names = list(people)
+    index = {name: i for i, name in enumerate(names)}
+    mothers = np.array([index.get(people[name]["mother"], -1) for name in names])
+    fathers = np.array([index.get(people[name]["father"], -1) for name in names])
+
+    # Order people so that parents come before their children
+    order = []
+    placed = set()
+
+    def place(i):
+        if i in placed:
+            return
+        placed.add(i)
+        if mothers[i] >= 0:
+            place(mothers[i])
+            place(fathers[i])
+        order.append(i)
+
+    for i in range(len(names)):
+        place(i)
+
+    # Index of each person's family, with people in order of family
+    family = np.zeros(len(names), dtype=np.int64)
+    for i, component in enumerate(components(people)):
+        family[[index[name] for name in component]] = i
+    by_family = np.argsort(family, kind="stable")
+
+    children = [[] for _ in names]
+    for i in range(len(names)):
+        if mothers[i] >= 0:
+            children[mothers[i]].append((i, 0))
+            children[fathers[i]].append((i, 1))
+
+    # Probability of each person's known trait (or 1) by number of genes,
+    # and of having the trait by number of genes
+    evidence = np.array([
+        [1 if people[name]["trait"] is None
+         else PROBS["trait"][n][people[name]["trait"]] for n in range(3)]
+        for name in names
+    ])
+    sampler_worker.update(
+        mothers=mothers, fathers=fathers, order=order, children=children,
+        evidence=evidence, family=family, by_family=by_family,
+        gene=np.array([PROBS["gene"][n] for n in range(3)]),
+        inheritance=inheritance_table(),
+        log_inheritance=np.log(inheritance_table()),
+        trait=np.array([PROBS["trait"][n][True] for n in range(3)])
+    )
+
+
+def run_chain(task):
+    """
+    Run one chain of `sample_probabilities` from a (method, seed,
+    samples, seconds) task, and return a dictionary of its estimates.
+    """
+    method, seed, samples, seconds = task
+    rng = np.random.default_rng(seed)
+    deadline = None if seconds is None else time.time() + seconds
+    if method == "likelihood":
+        return likelihood_chain(rng, samples, deadline)
+    return gibbs_chain(rng, samples, deadline)
+
+
+def draw_genes(rng, count):
+    """
+    Return `count` gene assignments drawn from parents to children,
+    as an array with one row per assignment and one column per person.
+    """
+    w = sampler_worker
+    genes = np.zeros((count, len(w["order"])), dtype=np.int64)
+    for i in w["order"]:
+        if w["mothers"][i] < 0:
+            p = np.broadcast_to(w["gene"], (count, 3))
+        else:
+            p = w["inheritance"][genes[:, w["mothers"][i]],
+                                 genes[:, w["fathers"][i]]]
+        genes[:, i] = choose(rng, p)
+    return genes
+
+
+def choose(rng, p):
+    """
+    Return, for each row of `p`, an index drawn in proportion to its
+    (unnormalized) probabilities.
+    """
+    cumulative = np.cumsum(p, axis=1)
+    u = rng.random(len(p)) * cumulative[:, -1]
+    return (u[:, np.newaxis] >= cumulative[:, :-1]).sum(axis=1)
+
+
+def likelihood_chain(rng, samples, deadline):
+    """
+    Run a chain of likelihood weighting in batches of BATCH_SIZE draws.
+    Each family's weights are accumulated relative to its `scale`, the
+    largest log weight so far, so that they cannot all underflow to 0.
+    """
+    w = sampler_worker
+    n = len(w["order"])
+    family, by_family = w["family"], w["by_family"]
+    families = family.max() + 1
+    starts = np.searchsorted(family[by_family], np.arange(families))
+
+    genes = np.zeros((n, 3))
+    traits = np.zeros(n)
+    weight = np.zeros(families)
+    squared = np.zeros(families)
+    scale = np.full(families, -np.inf)
+    drawn = 0
+    while drawn < samples and (deadline is None or time.time() < deadline):
+        # Batches of about BATCH_SIZE * 64 genes, so that the deadline is
+        # checked often even for large families
+        size = max(1, min(BATCH_SIZE, (BATCH_SIZE << 6) // n))
+        batch = draw_genes(rng, min(size, samples - drawn))
+        log_evidence = np.log(w["evidence"][np.arange(n), batch])
+        log_weights = np.add.reduceat(log_evidence[:, by_family], starts, axis=1)
+        if (log_weights.max(axis=0) > scale).any():
+            new_scale = np.maximum(scale, log_weights.max(axis=0))
+            rescale = np.exp(scale - new_scale)
+            genes *= rescale[family, np.newaxis]
+            traits *= rescale[family]
+            weight *= rescale
+            squared *= rescale ** 2
+            scale = new_scale
+        weights = np.exp(log_weights - scale)
+        for i in range(n):
+            genes[i] += np.bincount(batch[:, i], weights=weights[:, family[i]],
+                                    minlength=3)
+        traits += (weights[:, family] * w["trait"][batch]).sum(axis=0)
+        weight += weights.sum(axis=0)
+        squared += (weights ** 2).sum(axis=0)
+        drawn += len(batch)
+    return {"genes": genes / weight[family, np.newaxis],
+            "traits": traits / weight[family], "weight": weight,
+            "squared": squared, "scale": scale, "family": family,
+            "samples": drawn}
+
+
+def gibbs_chain(rng, samples, deadline):
+    """
+    Run a chain of Gibbs sampling with WALKERS assignments updated
+    together, starting from draws from parents to children. After
+    BURN_IN sweeps, every sweep's share of assignments with each number
+    of genes is counted, until `samples` assignments have been counted.
+    With a `deadline`, at most half the time left after the first sweep
+    is spent on burn-in.
+    """
+    w = sampler_worker
+    n = len(w["order"])
+    genes = draw_genes(rng, WALKERS)
+    totals = np.zeros((n, 3))
+    squares = np.zeros((n, 3))
+    traits = np.zeros(n)
+    sweeps = 0
+    burn_in = BURN_IN
+    start = time.time()
+    first = True
+    while sweeps * WALKERS < samples or not sweeps:
+        if deadline is not None and time.time() >= deadline:
+            if sweeps:
+                break
+            # Out of time: count sweeps from now, with no more burn-in
+            burn_in = 0
+        for i in w["order"]:
+            if w["mothers"][i] < 0:
+                p = np.broadcast_to(w["gene"], (WALKERS, 3))
+            else:
+                p = w["inheritance"][genes[:, w["mothers"][i]],
+                                     genes[:, w["fathers"][i]]]
+            # Multiply in children's probabilities as logarithms, as many
+            # small factors could underflow
+            log_p = np.log(p * w["evidence"][i])
+            for child, role in w["children"][i]:
+                other = genes[:, w["fathers"][child] if role == 0
+                              else w["mothers"][child]]
+                if role == 0:
+                    log_p += w["log_inheritance"][:, other, genes[:, child]].T
+                else:
+                    log_p += w["log_inheritance"][other, :, genes[:, child]]
+            genes[:, i] = choose(
+                rng, np.exp(log_p - log_p.max(axis=1, keepdims=True))
+            )
+        if first and deadline is not None:
+            left = (deadline - time.time()) / (time.time() - start)
+            burn_in = min(burn_in, int(left / 2))
+        first = False
+        if burn_in:
+            burn_in -= 1
+            continue
+
+        shares = np.stack(
+            [(genes == copies).mean(axis=0) for copies in range(3)], axis=1
+        )
+        totals += shares
+        squares += shares ** 2
+        traits += w["trait"][genes].mean(axis=0)
+        sweeps += 1
+
+    means = totals / sweeps
+    variances = (squares - sweeps * means ** 2) / max(1, sweeps - 1)
+    return {"genes": means, "traits": traits / sweeps,
+            "variances": np.maximum(variances, 0), "samples": sweeps * WALKERS}
+
+
+@functools.lru_cache(maxsize=None)
+def inheritance_table():
+    """
+    Return an array whose [mother, father, child] entry is the probability
+    that a child has `child` copies of the gene, given that their parents
+    have `mother` and `father` copies.
+
+    The table is computed from PROBS once, and is read-only.
+    """
+    # Probability of passing the gene on, by number of copies
+    passes = [PROBS["mutation"], 0.5, 1 - PROBS["mutation"]]
+    table = np.zeros((3, 3, 3))
+    for mother, father in itertools.product(range(3), repeat=2):
+        m, f = passes[mother], passes[father]
+        table[mother, father, 2] = m * f
+        table[mother, father, 1] = m * (1 - f) + (1 - m) * f
+        table[mother, father, 0] = (1 - m) * (1 - f)
+    table.flags.writeable = False
+    return table
+
+
+def gene_factors(people):
+    """
+    Return a list of one Factor per person: the probability of their
+    number of copies of the gene given their parents' (or unconditionally,
+    for people with no parents listed), times the probability of their
+    trait if it is known.
+    """
+    inheritance = inheritance_table()
+    factors = []
+    for person in people:
+        trait = people[person]["trait"]
+        evidence = np.array([
+            1 if trait is None else PROBS["trait"][n][trait] for n in range(3)
+        ])
+        mother, father = people[person]["mother"], people[person]["father"]
+        if mother is None and father is None:
+            prior = np.array([PROBS["gene"][n] for n in range(3)])
+            factors.append(Factor((person,), prior * evidence))
+        else:
+            factors.append(Factor((mother, father, person), inheritance * evidence))
+    return factors
+
+
+def elimination_order(factors):
+    """
+    Return the order in which to eliminate every variable of `factors`,
+    and for each, the cluster of variables it is eliminated together with:
+    itself and its neighbours at the time. Variables are chosen greedily
+    by fewest neighbours, connecting the neighbours of each eliminated one.
+    """
+    neighbors = dict()
+    for factor in factors:
+        for variable in factor.variables:
+            neighbors.setdefault(variable, set()).update(factor.variables)
+            neighbors[variable].discard(variable)
+
+    # Heap of (number of neighbours, tie breaker, variable), with stale
+    # entries skipped when popped
+    heap = [(len(near), i, v) for i, (v, near) in enumerate(neighbors.items())]
+    heapq.heapify(heap)
+    counter = len(heap)
+    order = []
+    clusters = []
+    while heap:
+        degree, _, variable = heapq.heappop(heap)
+        if variable not in neighbors or degree != len(neighbors[variable]):
+            continue
+        near = neighbors.pop(variable)
+        order.append(variable)
+        clusters.append((variable,) + tuple(sorted(near)))
+        for neighbor in near:
+            neighbors[neighbor] |= near
+            neighbors[neighbor] -= {neighbor, variable}
+            heapq.heappush(heap, (len(neighbors[neighbor]), counter, neighbor))
+            counter += 1
+    return order, clusters
+
+
+def gene_marginals(factors):
+    """
+    Return a dictionary mapping each variable of `factors` to its
+    normalized marginal distribution, as an array indexed by value.
+
+    Clusters from `elimination_order` form a junction tree, where each
+    cluster's parent is the cluster of the first variable of its
+    separator (its variables but the eliminated one) to be eliminated.
+    Messages are passed from the leaves up and then back down, each
+    normalized so that large families do not underflow.
+    """
+    order, clusters = elimination_order(factors)
+    position = {variable: i for i, variable in enumerate(order)}
+    separators = [cluster[1:] for cluster in clusters]
+    parents = [
+        min((position[v] for v in separator), default=None)
+        for separator in separators
+    ]
+    children = [[] for _ in clusters]
+    for i, parent in enumerate(parents):
+        if parent is not None:
+            children[parent].append(i)
+
+    # Multiply each factor into the cluster of its first eliminated variable
+    potentials = [[Factor(cluster, np.ones((3,) * len(cluster)))]
+                  for cluster in clusters]
+    for factor in factors:
+        potentials[min(position[v] for v in factor.variables)].append(factor)
+    potentials = [
+        Factor(cluster, contract(potential, cluster))
+        for cluster, potential in zip(clusters, potentials)
+    ]
+
+    # Pass messages up, in elimination order, and back down
+    up = [None] * len(clusters)
+    down = [None] * len(clusters)
+    for i, parent in enumerate(parents):
+        if parent is not None:
+            incoming = [potentials[i]] + [up[child] for child in children[i]]
+            up[i] = Factor(separators[i], contract(incoming, separators[i]))
+    marginals = dict()
+    for i in reversed(range(len(clusters))):
+        incoming = [potentials[i]] + [up[child] for child in children[i]]
+        if down[i] is not None:
+            incoming.append(down[i])
+        belief = Factor(clusters[i], contract(incoming, clusters[i]))
+        marginals[order[i]] = belief.table.sum(
+            axis=tuple(range(1, len(clusters[i])))
+        )
+
+        # Every probability is positive, so a child's own message can be
+        # divided back out of the belief rather than leaving it out
+        for child in children[i]:
+            divide = Factor(separators[child], 1 / up[child].table)
+            down[child] = Factor(
+                separators[child], contract([belief, divide], separators[child])
+            )
+    return marginals
+
+
+def contract(factors, variables):
+    """
+    Return the product of `factors`, summed over every variable not in
+    `variables`, as a normalized table over `variables` in order.
+    """
+    # NumPy multiplies at most 32 operands at once, so multiply any more
+    # a group at a time
+    while len(factors) > 16:
+        group = factors[:16]
+        union = tuple(dict.fromkeys(v for factor in group for v in factor.variables))
+        factors = [Factor(union, contract(group, union))] + factors[16:]
+
+    ids = dict()
+    operands = []
+    for factor in factors:
+        operands.append(factor.table)
+        operands.append([ids.setdefault(v, len(ids)) for v in factor.variables])
+    table = np.einsum(*operands, [ids[v] for v in variables])
+    return table / table.sum()
+
+
+# Ways of computing everyone's gene and trait probabilities, by name
+MODES = {
+    "enumerate": enumerate_probabilities,
+    "elimination": elimination_probabilities,
+    "batched": batched_probabilities,
+    "pruned": pruned_probabilities,
+    "likelihood": likelihood_probabilities,
+    "gibbs": gibbs_probabilities
+}
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,229 @@
+import math
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from generate import generate_corpus, write_html
+from pagerank import (DAMPING, PRECISION, REFERENCE_LIMIT, SAMPLES,
+                      STRATEGIES, TOLERANCE, crawl, fast_sample_pagerank,
+                      iterate_pagerank, link_matrix, load_edges,
+                      make_link_matrix, matrix_corpus, matrix_pagerank,
+                      parallel_sample_pagerank, sample_pagerank, save_edges,
+                      update_pagerank, walkers_pagerank)
+
+# Numbers of pages of the generated corpora
+SIZES = [100, 1000, 10_000, 100_000]
+
+# Largest difference allowed from the exact PageRank of any page, for
+# `iterate_pagerank` (which stops once no page changes by over 0.001)
+# and for the strategies (which stop at an L1 change of TOLERANCE)
+ITERATE_AGREEMENT = 0.01
+STRATEGY_AGREEMENT = 1e-6
+
+# Number of standard errors a sampled PageRank may be from the exact one
+SAMPLED_AGREEMENT = 6
+
+# Convergence threshold for computing the exact PageRank
+EXACT_TOLERANCE = 1e-12
+
+# Number of links removed, and of links added, before updating PageRank
+UPDATE_CHANGES = 50
+
+# Smallest corpus on which `update_pagerank` must be faster than
+# recomputing PageRank with `matrix_pagerank`, as smaller corpora take
+# milliseconds and their timings are mostly noise
+UPDATE_TIMED = 100_000
+
+# Number of runs of each of them timed, keeping the fastest
+UPDATE_RUNS = 3
+
+
+def main():
+    if len(sys.argv) > 1 and not all(arg.isdigit() for arg in sys.argv[1:]):
+        sys.exit("Usage: python benchmark.py [pages ...]")
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+
+    disagreements = []
+    for corpus in ["corpus0", "corpus1", "corpus2"]:
+        disagreements += benchmark(corpus, corpus)
+    for n in sizes:
+        disagreements += benchmark(f"generated {n}", generate_corpus(n, seed=n))
+
+    # Fail like a test suite if any method disagrees with the exact PageRank
+    if disagreements:
+        sys.exit(f"Results disagree with the exact PageRank: {disagreements}")
+
+
+def benchmark(name, corpus):
+    """
+    Time reading a corpus (a directory, or a corpus dictionary which is
+    written out as HTML and as an edge list), and every way of computing
+    its PageRank, printing each result's largest difference from the
+    exact PageRank. Return a list of the methods that disagree with it.
+    """
+    if isinstance(corpus, str):
+        corpus, crawl_time = timed(crawl, corpus)
+        edges_time = None
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            write_html(corpus, directory)
+            crawled, crawl_time = timed(crawl, directory)
+            filename = os.path.join(directory, "edges.txt")
+            save_edges(corpus, filename)
+            matrix, edges_time = timed(load_edges, filename)
+        if crawled != corpus or matrix_corpus(matrix) != corpus:
+            return [f"{name}: reading links"]
+
+    matrix = link_matrix(corpus)
+    exact = matrix_pagerank(matrix, DAMPING, EXACT_TOLERANCE)
+    print(f"{name} ({len(matrix.pages)} pages, {len(matrix.sources)} links)")
+    print(f"  {'crawl':<26} {1000 * crawl_time:10.1f} ms")
+    if edges_time is not None:
+        print(f"  {'load_edges':<26} {1000 * edges_time:10.1f} ms")
+
+    # Each method returns its PageRank values, the largest difference
+    # from the exact PageRank allowed for each page, and any details
+    sampled = {
+        page: SAMPLED_AGREEMENT * sampling_error(rank, SAMPLES) + 1 / SAMPLES
+        for page, rank in exact.items()
+    }
+    methods = [
+        ("fast_sample_pagerank", lambda: (
+            fast_sample_pagerank(corpus, DAMPING, SAMPLES), sampled, ""
+        )),
+        ("walkers_pagerank", lambda: (
+            walkers_pagerank(matrix, DAMPING, SAMPLES), sampled, ""
+        )),
+        ("parallel_sample_pagerank", lambda: parallel_sample(matrix))
+    ]
+    if len(corpus) <= REFERENCE_LIMIT:
+        methods = [
+            ("sample_pagerank", lambda: (
+                sample_pagerank(corpus, DAMPING, SAMPLES), sampled, ""
+            )),
+            ("iterate_pagerank", lambda: (
+                iterate_pagerank(corpus, DAMPING),
+                dict.fromkeys(exact, ITERATE_AGREEMENT), ""
+            ))
+        ] + methods
+    for strategy, solve in STRATEGIES.items():
+        methods.append((strategy, lambda solve=solve: solved(matrix, solve)))
+
+    disagreements = []
+    for method, function in methods:
+        (ranks, allowed, details), elapsed = timed(function)
+        difference = max(abs(ranks[page] - exact[page]) for page in exact)
+        agrees = all(abs(ranks[page] - exact[page]) <= allowed[page]
+                     for page in exact)
+        print(f"  {method:<26} {1000 * elapsed:10.1f} ms"
+              f"  max difference {difference:.2e}  {details}"
+              f"{'' if agrees else '  DISAGREES'}")
+        if not agrees:
+            disagreements.append(f"{name}: {method}")
+    return disagreements + benchmark_update(name, matrix)
+
+
+def benchmark_update(name, matrix):
+    """
+    Change some links of a LinkMatrix, and time `update_pagerank` from
+    the PageRank before the changes against recomputing it with
+    `matrix_pagerank`. Return a list holding `update_pagerank` if it
+    disagrees with the exact PageRank, or if it is slower on a corpus of
+    at least UPDATE_TIMED pages.
+    """
+    previous = matrix_pagerank(matrix, DAMPING)
+    matrix = change_links(matrix, UPDATE_CHANGES, seed=len(matrix.pages))
+    exact = matrix_pagerank(matrix, DAMPING, EXACT_TOLERANCE)
+
+    ranks, update_time = fastest(update_pagerank, matrix, DAMPING, previous)
+    _, matrix_time = fastest(matrix_pagerank, matrix, DAMPING)
+    difference = max(abs(ranks[page] - exact[page]) for page in exact)
+    agrees = difference <= STRATEGY_AGREEMENT
+    slower = update_time > matrix_time and len(matrix.pages) >= UPDATE_TIMED
+    print(f"  {'update_pagerank':<26} {1000 * update_time:10.1f} ms"
+          f"  max difference {difference:.2e}"
+          f"  matrix_pagerank {1000 * matrix_time:.1f} ms"
+          f"{'' if agrees else '  DISAGREES'}{'  SLOWER' if slower else ''}")
+    return [f"{name}: update_pagerank"] if not agrees or slower else []
+
+
+def change_links(matrix, changes, seed=None):
+    """
+    Return a copy of a LinkMatrix with up to `changes` of its links
+    replaced by random links.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(matrix.pages)
+    destinations = np.repeat(np.arange(n), np.diff(matrix.indptr))
+    sources = matrix.sources.copy()
+    changed = rng.choice(len(sources), min(changes, len(sources)),
+                         replace=False)
+    destinations[changed] = rng.integers(n, size=len(changed))
+    sources[changed] = rng.integers(n, size=len(changed))
+    return make_link_matrix(matrix.pages, destinations, sources)
+
+
+def timed(function, *args):
+    """
+    Return the result of calling `function` with `args`, and the number
+    of seconds the call took.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def fastest(function, *args):
+    """
+    Return the result of calling `function` with `args`, and the number
+    of seconds the fastest of UPDATE_RUNS calls took.
+    """
+    times = []
+    for _ in range(UPDATE_RUNS):
+        result, elapsed = timed(function, *args)
+        times.append(elapsed)
+    return result, min(times)
+
+
+def parallel_sample(matrix):
+    """
+    Return PageRank values from `parallel_sample_pagerank`, the largest
+    difference from the exact PageRank allowed for each page given their
+    standard errors, and no details.
+    """
+    # A finer precision than the default runs enough batches for their
+    # standard errors to be trusted, even with few processes
+    ranks, errors = parallel_sample_pagerank(matrix, DAMPING, PRECISION / 10)
+    allowed = {
+        page: SAMPLED_AGREEMENT * error + 1 / SAMPLES
+        for page, error in errors.items()
+    }
+    return ranks, allowed, ""
+
+
+def solved(matrix, solve):
+    """
+    Return PageRank values from one of the STRATEGIES, the largest
+    difference from the exact PageRank allowed for each page,
+    and the number of iterations taken.
+    """
+    ranks, iterations = solve(matrix, DAMPING, TOLERANCE)
+    return (dict(zip(matrix.pages, ranks.tolist())),
+            dict.fromkeys(matrix.pages, STRATEGY_AGREEMENT),
+            f"{iterations} iterations")
+
+
+def sampling_error(rank, samples):
+    """
+    Return the approximate standard error of a PageRank of `rank`
+    estimated from `samples` steps of a single random walk, where
+    consecutive steps are correlated for about 1 / (1 - DAMPING) steps.
+    """
+    return math.sqrt(rank * (1 + DAMPING) / (1 - DAMPING) / samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import sys
+
+from pagerank import crawl, save_links
+
+
+def main():
+    if len(sys.argv) not in [3, 4]:
+        sys.exit("Usage: python crawl.py directory links.npz [processes]")
+    processes = int(sys.argv[3]) if len(sys.argv) == 4 else None
+
+    corpus = crawl(sys.argv[1], processes)
+    save_links(corpus, sys.argv[2])
+    links = sum(len(links) for links in corpus.values())
+    print(f"Saved {len(corpus)} pages and {links} links to {sys.argv[2]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import os
+import random
+import sys
+
+from pagerank import save_edges
+
+# Mean number of links on a page that has links
+LINKS = 8
+
+# Fraction of pages with no links
+DANGLING = 0.1
+
+# Fraction of links to a page chosen uniformly from the whole corpus,
+# which may come later than the linking page and so close cycles
+RANDOM_LINKS = 0.2
+
+
+def main():
+    if len(sys.argv) not in [3, 4]:
+        sys.exit("Usage: python generate.py pages (directory | edges.txt) [seed]")
+    seed = int(sys.argv[3]) if len(sys.argv) == 4 else None
+
+    corpus = generate_corpus(int(sys.argv[1]), seed=seed)
+    if sys.argv[2].endswith(".txt"):
+        save_edges(corpus, sys.argv[2])
+    else:
+        write_html(corpus, sys.argv[2])
+    links = sum(len(links) for links in corpus.values())
+    print(f"Generated {len(corpus)} pages and {links} links in {sys.argv[2]}")
+
+
+def generate_corpus(n, links=LINKS, dangling=DANGLING, seed=None):
+    """
+    Return a corpus dictionary of `n` pages named "0.html", "1.html", ...
+    grown by preferential attachment: pages are added one at a time, and
+    each link goes, with equal chances, to a page chosen in proportion to
+    its number of incoming links so far (the destination of a random
+    earlier link) or to an earlier page chosen uniformly, so a few pages
+    collect most links.
+
+    A `dangling` fraction of pages have no links, and a RANDOM_LINKS
+    fraction of links instead go to any page, closing cycles. The other
+    pages have between 1 and 2 * `links` - 1 links, before leaving out
+    duplicate links and links to the page itself.
+    """
+    rng = random.Random(seed)
+    pages = [f"{i}.html" for i in range(n)]
+
+    # Destination of every link so far, so that choosing one uniformly
+    # chooses a page in proportion to its incoming links
+    targets = []
+    corpus = dict()
+    for i in range(n):
+        page_links = set()
+        if rng.random() >= dangling:
+            for _ in range(rng.randint(1, 2 * links - 1)):
+                if i == 0 or rng.random() < RANDOM_LINKS:
+                    link = rng.randrange(n)
+                elif targets and rng.random() < 0.5:
+                    link = rng.choice(targets)
+                else:
+                    link = rng.randrange(i)
+                page_links.add(link)
+            page_links.discard(i)
+        targets.extend(page_links)
+        corpus[pages[i]] = {pages[link] for link in page_links}
+    return corpus
+
+
+def write_html(corpus, directory):
+    """
+    Write a corpus dictionary to `directory` as one HTML page per page,
+    in the format of the bundled corpora.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for page, links in corpus.items():
+        title = os.path.splitext(page)[0]
+        items = "".join(
+            f'            <li><a href="{link}">{os.path.splitext(link)[0]}</a></li>\n'
+            for link in sorted(links)
+        )
+        with open(os.path.join(directory, page), "w") as f:
+            f.write(
+                "<!DOCTYPE html>\n"
+                '<html lang="en">\n'
+                "    <head>\n"
+                f"        <title>{title}</title>\n"
+                "    </head>\n"
+                "    <body>\n"
+                f"        <h1>{title}</h1>\n"
+                "\n"
+                "        <div>Links:</div>\n"
+                "        <ul>\n"
+                f"{items}"
+                "        </ul>\n"
+                "    </body>\n"
+                "</html>\n"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,135 @@
+import html
+import itertools
+import json
+import multiprocessing
 import os
+import posixpath
 import random
 import re
 import sys
 
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
+
 DAMPING = 0.85
 SAMPLES = 10000
 
+# Convergence threshold on the L1 change in PageRank between iterations
+TOLERANCE = 1e-8
+
+# Largest corpus to run `sample_pagerank` and `iterate_pagerank` on,
+# as both take time proportional to the square of the number of pages
+REFERENCE_LIMIT = 1000
+
+# Target standard error of each page's sampled PageRank
+PRECISION = 0.001
+
+# Largest chance left after burn-in that a random walker has followed
+# links all the way from its starting page
+MIXING = 1e-3
+
+# The href of an <a> tag, in double or single quotes
+LINK_PATTERN = re.compile(
+    r"""<a\s[^>]*?\bhref\s*=\s*(?:"([^"]*)"|'([^']*)')""", re.IGNORECASE
+)
+
+# Fewest HTML files to parse across a pool of processes, as starting the
+# pool and sending back the links costs about as much as parsing a thousand
+PARALLEL_FILES = 2000
+
+# A link to a file in the same directory, with nothing to resolve
+PLAIN_LINK = re.compile(r"[^/:?#&.][^/:?#&]*")
+
+# Largest fraction of the pages `update_pagerank` pushes residuals on in
+# one round before switching to power iteration
+PUSH_FRACTION = 1 / 16
+
+# Number of characters of an HTML file parsed at a time
+CHUNK_SIZE = 1 << 16
+
+# Links of a corpus in compressed sparse row (CSR) form, by destination:
+# pages linking to pages[i] are pages[sources[indptr[i]:indptr[i + 1]]],
+# and outdegree[i] is the number of links on pages[i]. The same links
+# weighted by 1 / outdegree of their source make up `transition`, a
+# SciPy CSR matrix of the probabilities of following each link, and its
+# transpose `outgoing`, in CSR form by source: pages[i] links to
+# pages[outgoing[i].indices]
+LinkMatrix = namedtuple(
+    "LinkMatrix",
+    ["pages", "indptr", "sources", "outdegree", "transition", "outgoing"]
+)
+
 
 def main():
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python pagerank.py corpus")
-    corpus = crawl(sys.argv[1])
-    ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
+    if len(sys.argv) not in [2, 3]:
+        sys.exit("Usage: python pagerank.py corpus [ranks.json]")
+
+    # A corpus is a directory of HTML pages, a saved link file or an edge list
+    if os.path.isdir(sys.argv[1]):
+        corpus = crawl(sys.argv[1])
+    elif sys.argv[1].endswith(".npz"):
+        corpus = load_links(sys.argv[1])
+    else:
+        corpus = load_edges(sys.argv[1])
+
+    # Saved links and large corpora go straight to the sparse matrix
+    # methods, as the reference methods take quadratic time
+    reference = (not isinstance(corpus, LinkMatrix)
+                 and len(corpus) <= REFERENCE_LIMIT)
+    if reference:
+        ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
+    else:
+        ranks = walkers_pagerank(corpus, DAMPING, SAMPLES)
     print(f"PageRank Results from Sampling (n = {SAMPLES})")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
-    ranks = iterate_pagerank(corpus, DAMPING)
+    if reference:
+        ranks = iterate_pagerank(corpus, DAMPING)
+    else:
+        ranks = matrix_pagerank(corpus, DAMPING)
     print(f"PageRank Results from Iteration")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
 
+    # Update ranks saved by a previous run, warm-starting from them
+    if len(sys.argv) == 3:
+        if os.path.exists(sys.argv[2]):
+            ranks = update_pagerank(corpus, DAMPING, load_ranks(sys.argv[2]))
+        else:
+            ranks = matrix_pagerank(corpus, DAMPING)
+        save_ranks(ranks, sys.argv[2])
+        print(f"PageRank Results from Update (saved to {sys.argv[2]})")
+        for page in sorted(ranks):
+            print(f"  {page}: {ranks[page]:.4f}")
+
 
-def crawl(directory):
+def crawl(directory, processes=None):
     """
     Parse a directory of HTML pages and check for links to other pages.
     Return a dictionary where each key is a page, and values are
     a list of all other pages in the corpus that are linked to by the page.
+
+    Subdirectories are crawled too: pages are named by their path
+    relative to `directory`, with "/" separators, and relative links are
+    resolved against the linking page's directory. Corpora of at least
+    PARALLEL_FILES files are parsed across a pool of `processes` worker
+    processes (by default, one per CPU).
     """
-    pages = dict()
+    filenames = sorted(html_files(directory))
 
     # Extract all links from HTML files
-    for filename in os.listdir(directory):
-        if not filename.endswith(".html"):
-            continue
-        with open(os.path.join(directory, filename)) as f:
-            contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
-            pages[filename] = set(links) - {filename}
+    tasks = [(directory, filename) for filename in filenames]
+    processes = processes or os.cpu_count()
+    if processes == 1 or len(tasks) < PARALLEL_FILES:
+        pages = dict(extract_links(*task) for task in tasks)
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            chunksize = max(1, len(tasks) // (4 * processes))
+            pages = dict(pool.starmap(extract_links, tasks, chunksize))
 
     # Only include links to other pages in the corpus
     for filename in pages:
@@ -48,6 +141,160 @@ def crawl(directory):
     return pages
 
 
+def html_files(directory):
+    """
+    Yield the paths, relative to `directory` and with "/" separators,
+    of all HTML files in `directory` and its subdirectories.
+    """
+    for root, _, files in os.walk(directory):
+        relative = os.path.relpath(root, directory)
+        for filename in files:
+            if not filename.endswith(".html"):
+                continue
+            if relative == os.curdir:
+                yield filename
+            else:
+                yield posixpath.join(*relative.split(os.sep), filename)
+
+
+def extract_links(directory, page):
+    """
+    Return a pair of `page` and the set of pages it links to,
+    reading the file a chunk at a time. Links are normalized, and
+    links to other sites or to the page itself are left out.
+
+    Each chunk is scanned for the href of <a> tags, and any tag left
+    unfinished at the end of a chunk is carried over into the next one.
+    """
+    hrefs = set()
+    tail = ""
+    with open(os.path.join(directory, *page.split("/")), errors="replace") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            text = tail + chunk
+            for double, single in LINK_PATTERN.findall(text):
+                hrefs.add(double or single)
+
+            # Carry over the last tag, which may be unfinished, unless it is
+            # too long to be a tag. Hrefs found in it again are deduplicated
+            start = text.rfind("<")
+            if start < 0 or len(text) - start > CHUNK_SIZE:
+                start = len(text)
+            tail = text[start:]
+
+    # Plain file names need no parsing
+    folder = posixpath.dirname(page)
+    links = set()
+    for link in hrefs:
+        if PLAIN_LINK.fullmatch(link):
+            link = f"{folder}/{link}" if folder else link
+        else:
+            link = normalize_link(page, html.unescape(link))
+        if link is not None:
+            links.add(link)
+    return page, links - {page}
+
+
+def normalize_link(page, link):
+    """
+    Return the page a link found on `page` refers to, as a path relative
+    to the corpus root, or None if it does not refer to a page in the corpus.
+    """
+    parts = urlsplit(link)
+    if parts.scheme or parts.netloc or not parts.path:
+        return None
+
+    # Absolute paths start from the corpus root
+    if parts.path.startswith("/"):
+        path = posixpath.normpath(parts.path.lstrip("/"))
+    else:
+        path = posixpath.normpath(
+            posixpath.join(posixpath.dirname(page), parts.path)
+        )
+    if path.startswith("../") or path == "..":
+        return None
+    return path
+
+
+def save_links(corpus, filename):
+    """
+    Save the links of a corpus (a corpus dictionary or a LinkMatrix)
+    to `filename` as a compressed NumPy archive, holding the page names
+    and the links as arrays of destination and source page ids.
+    """
+    matrix = corpus if isinstance(corpus, LinkMatrix) else link_matrix(corpus)
+    destinations = np.repeat(
+        np.arange(len(matrix.pages), dtype=np.int32), np.diff(matrix.indptr)
+    )
+    with open(filename, "wb") as f:
+        np.savez_compressed(
+            f, pages=np.array(matrix.pages, dtype=str),
+            destinations=destinations,
+            sources=matrix.sources.astype(np.int32)
+        )
+
+
+def load_links(filename):
+    """
+    Load links saved by `save_links` into a LinkMatrix.
+    """
+    with np.load(filename) as data:
+        return make_link_matrix(
+            data["pages"].tolist(),
+            data["destinations"].astype(np.int64),
+            data["sources"].astype(np.int64)
+        )
+
+
+def save_edges(corpus, filename):
+    """
+    Save the links of a corpus dictionary to `filename` as a text edge
+    list: one line per link, holding the linking page and the linked page
+    separated by a tab, so that page names may contain spaces. A page
+    with no links gets a line of its own.
+    """
+    with open(filename, "w") as f:
+        for page, links in corpus.items():
+            if not links:
+                f.write(f"{page}\n")
+            for link in sorted(links):
+                f.write(f"{page}\t{link}\n")
+
+
+def load_edges(filename):
+    """
+    Load an edge list saved by `save_edges` into a LinkMatrix,
+    with pages in the order they first appear.
+    """
+    ids = dict()
+    destinations = []
+    sources = []
+    with open(filename) as f:
+        for line in f:
+            names = line.rstrip("\n").split("\t")
+            if names == [""]:
+                continue
+            source = ids.setdefault(names[0], len(ids))
+            for name in names[1:]:
+                sources.append(source)
+                destinations.append(ids.setdefault(name, len(ids)))
+    return make_link_matrix(
+        list(ids),
+        np.array(destinations, dtype=np.int64),
+        np.array(sources, dtype=np.int64)
+    )
+
+
+def matrix_corpus(matrix):
+    """
+    Return a corpus dictionary with the links of a LinkMatrix.
+    """
+    corpus = {page: set() for page in matrix.pages}
+    for i, page in enumerate(matrix.pages):
+        for source in matrix.sources[matrix.indptr[i]:matrix.indptr[i + 1]]:
+            corpus[matrix.pages[source]].add(page)
+    return corpus
+
+
 def transition_model(corpus, page, damping_factor):
     """
     Return a probability distribution over which page to visit next,
@@ -117,7 +364,170 @@ def sample_pagerank(corpus, damping_factor, n):
     return sample_dict
 
 
-def iterate_pagerank(corpus, damping_factor):
+def fast_sample_pagerank(corpus, damping_factor, n):
+    """
+    Return PageRank values for each page by sampling `n` pages
+    according to transition model, starting with a page at random.
+
+    Rather than building the transition model's full distribution at
+    every step, each step flips a coin to decide between following a
+    link and jumping to a random page, then picks uniformly among the
+    precomputed links of the current page, so each step takes O(1).
+    """
+    pages = list(corpus)
+    ids = {page: i for i, page in enumerate(pages)}
+    links = [tuple(ids[link] for link in corpus[page]) for page in pages]
+    visits = [0] * len(pages)
+
+    sample = random.randrange(len(pages))
+    visits[sample] += 1
+    for _ in range(n - 1):
+        page_links = links[sample]
+
+        # Pages with no links choose randomly among all pages
+        if page_links and random.random() < damping_factor:
+            sample = page_links[random.randrange(len(page_links))]
+        else:
+            sample = random.randrange(len(pages))
+        visits[sample] += 1
+
+    return {page: visits[i] / n for i, page in enumerate(pages)}
+
+
+def walkers_pagerank(corpus, damping_factor, n, walkers=1000, seed=None,
+                     burn_in=None):
+    """
+    Return PageRank values for each page by sampling `n` pages with
+    many independent random walkers, each starting at a random page.
+
+    All walkers are advanced together with NumPy: one array of coin
+    flips decides which walkers follow a link, and one array of random
+    numbers picks the link (or page) each walker moves to.
+
+    Visits are only counted after `burn_in` steps, by default enough
+    steps for the chance that a walker has never jumped to a random page
+    to fall below MIXING, so that walkers no longer depend on where they
+    started.
+    """
+    matrix = corpus if isinstance(corpus, LinkMatrix) else link_matrix(corpus)
+    if burn_in is None:
+        burn_in = int(np.ceil(np.log(MIXING) / np.log(damping_factor)))
+    steps = burn_in + max(1, -(-n // walkers))
+    visits = walk(matrix, damping_factor, steps, walkers, seed,
+                  burn_in=burn_in)
+    return dict(zip(matrix.pages, (visits / visits.sum()).tolist()))
+
+
+def walk(matrix, damping_factor, steps, walkers, seed=None, links=None,
+         burn_in=0):
+    """
+    Advance `walkers` random walkers for `steps` steps each (counting
+    their random starting pages) and return how many times each page
+    was visited, as an array. Visits during the first `burn_in` steps,
+    while walkers are still close to their starting pages, are not counted.
+
+    `links` may give the result of `outlinks(matrix)`, to avoid
+    recomputing it for every walk.
+    """
+    indptr, targets = outlinks(matrix) if links is None else links
+    pages = len(matrix.pages)
+    degree = matrix.outdegree
+    rng = np.random.default_rng(seed)
+
+    position = rng.integers(pages, size=walkers)
+    visits = np.bincount(position, minlength=pages) * (burn_in == 0)
+    for step in range(1, steps):
+
+        # Walkers on pages with links follow one with probability `damping_factor`
+        follow = (rng.random(walkers) < damping_factor) & (degree[position] > 0)
+        choice = (rng.random(walkers) * degree[position]).astype(np.int64)
+
+        # The rest jump to a page chosen at random from the whole corpus
+        jumped = rng.integers(pages, size=walkers)
+        jumped[follow] = targets[indptr[position[follow]] + choice[follow]]
+        position = jumped
+        if step >= burn_in:
+            visits += np.bincount(position, minlength=pages)
+
+    return visits
+
+
+def parallel_sample_pagerank(corpus, damping_factor, precision=PRECISION,
+                             processes=None, walkers=1000, steps=500,
+                             burn_in=50, max_samples=10 ** 9, seed=None):
+    """
+    Return PageRank values for each page, and their standard errors, by
+    sampling with independent batches of random walkers across a process
+    pool, until every page's standard error is at most `precision`.
+
+    Each batch runs `walkers` walkers for `steps` steps from its own seed,
+    counting visits after the first `burn_in` steps, and gives an
+    independent estimate of every page's PageRank. The
+    standard error of a page is the standard deviation of its batch
+    estimates divided by the square root of the number of batches.
+    Sampling stops early once `max_samples` pages have been sampled.
+
+    Return a pair of dictionaries (ranks, errors) keyed by page.
+    """
+    matrix = corpus if isinstance(corpus, LinkMatrix) else link_matrix(corpus)
+    processes = processes or os.cpu_count()
+    seeds = np.random.SeedSequence(seed)
+
+    estimates = []
+    with multiprocessing.Pool(processes, initializer=start_walk_worker,
+                              initargs=(matrix, damping_factor, steps, walkers,
+                                        burn_in)) as pool:
+        while True:
+            # Run one round of batches, with at least two batches overall
+            batches = max(processes, 2 - len(estimates))
+            for visits in pool.map(walk_batch, seeds.spawn(batches)):
+                estimates.append(visits / visits.sum())
+
+            ranks = np.mean(estimates, axis=0)
+            errors = np.std(estimates, axis=0, ddof=1) / np.sqrt(len(estimates))
+            sampled = len(estimates) * walkers * (steps - burn_in)
+            if errors.max() <= precision or sampled >= max_samples:
+                break
+
+    return (dict(zip(matrix.pages, ranks.tolist())),
+            dict(zip(matrix.pages, errors.tolist())))
+
+
+# State of each worker process of `parallel_sample_pagerank`
+walk_worker = dict()
+
+
+def start_walk_worker(matrix, damping_factor, steps, walkers, burn_in):
+    """
+    Set up a worker process to run batches of random walkers on `matrix`.
+    """
+    walk_worker.update(
+        matrix=matrix, damping_factor=damping_factor, steps=steps,
+        walkers=walkers, burn_in=burn_in, links=outlinks(matrix)
+    )
+
+
+def walk_batch(seed):
+    """
+    Run one batch of random walkers in a worker process, and return
+    how many times each page was visited.
+    """
+    return walk(
+        walk_worker["matrix"], walk_worker["damping_factor"],
+        walk_worker["steps"], walk_worker["walkers"], seed,
+        walk_worker["links"], walk_worker["burn_in"]
+    )
+
+
+def outlinks(matrix):
+    """
+    Return the links of a LinkMatrix in CSR form by source, as arrays
+    (indptr, targets): pages[i] links to pages[targets[indptr[i]:indptr[i + 1]]].
+    """
+    return matrix.outgoing.indptr, matrix.outgoing.indices
+
+
+def iterate_pagerank(corpus, damping_factor, previous=None):
     """
     Return PageRank values for each page by iteratively updating
     PageRank values until convergence.
@@ -125,19 +535,27 @@ def iterate_pagerank(corpus, damping_factor):
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
+
+    If `previous` PageRank values are given (e.g. from before the corpus
+    changed), iteration starts from them instead of a uniform distribution.
     """
     # Initialize constants
     corpus_len = len(corpus.keys())
     init_rank = 1 / corpus_len
 
     # Initialize the ranks dictionary
-    ranks = {page: init_rank for page in corpus} # probability distribution
+    if previous is None:
+        ranks = {page: init_rank for page in corpus} # probability distribution
+    else:
+        pages = list(corpus)
+        ranks = dict(zip(pages, warm_start(pages, previous).tolist()))
 
-    # Repeat until no change larger than 0.001
-    max_change = init_rank
+    # Repeat until no change larger than 0.001, sweeping at least once
+    max_change = float("inf")
     while max_change > 0.001:
-        # Reset max_change
+        # Reset max_change, and compute every new PageRank from the old ones
         max_change = 0
+        new_ranks = dict()
         for page in corpus:
             # Calculate the sum of the PageRank of every page that links to the given page
             sum_pr = 0
@@ -151,11 +569,409 @@ def iterate_pagerank(corpus, damping_factor):
             page_rank = (1 - damping_factor) / corpus_len + damping_factor * sum_pr
             # Calculate the change in PageRank for all pages
             max_change = max(max_change, abs(page_rank - ranks[page]))
-            # Update the ranks dictionary
-            ranks[page] = page_rank
+            new_ranks[page] = page_rank
+        # Update the ranks dictionary
+        ranks = new_ranks
 
     return ranks
 
 
+def personalized_pagerank(corpus, damping_factor, seeds, tolerance=TOLERANCE,
+                          top_k=None):
+    """
+    Return personalized PageRank values for each of several seeds, where
+    random jumps (and moves from pages with no links) land on a seed's
+    pages instead of on any page of the corpus.
+
+    Each seed is either a collection of pages, to be jumped to with equal
+    probability, or a dictionary mapping pages to jump weights (e.g. the
+    pages of a topic). The jump distributions are the columns of one dense
+    matrix, so a single sparse-matrix product per iteration advances every
+    seed at once; seeds whose L1 change falls within `tolerance` drop out
+    of the iteration.
+
+    Return a list with a dictionary of PageRank values for each seed,
+    holding only the `top_k` highest-ranked pages if `top_k` is given.
+    """
+    matrix = corpus if isinstance(corpus, LinkMatrix) else link_matrix(corpus)
+    n = len(matrix.pages)
+    ids = {page: i for i, page in enumerate(matrix.pages)}
+    dangling = matrix.outdegree == 0
+
+    # One column of jump probabilities per seed
+    jumps = np.zeros((n, len(seeds)))
+    for column, seed in enumerate(seeds):
+        weights = seed if isinstance(seed, dict) else dict.fromkeys(seed, 1)
+        for page, weight in weights.items():
+            jumps[ids[page], column] = weight
+    jumps /= jumps.sum(axis=0)
+
+    ranks = jumps.copy()
+    active = np.arange(len(seeds))
+    while len(active):
+        block = ranks[:, active]
+        new_block = damping_factor * propagate(matrix, block) + jumps[:, active] * (
+            1 - damping_factor + damping_factor * block[dangling].sum(axis=0)
+        )
+        changes = np.abs(new_block - block).sum(axis=0)
+        ranks[:, active] = new_block
+        active = active[changes > tolerance]
+
+    # Keep only the highest ranks of each seed, if asked to
+    results = []
+    for column in ranks.T:
+        if top_k is None or top_k >= n:
+            top = range(n)
+        else:
+            top = np.argpartition(column, n - top_k)[n - top_k:]
+            top = top[np.argsort(-column[top])].tolist()
+        results.append({matrix.pages[i]: float(column[i]) for i in top})
+    return results
+
+
+def warm_start(pages, previous):
+    """
+    Return an array of starting PageRank values for `pages`, taken from
+    the `previous` values where available. Pages without a previous value
+    start with 1 / N, and the values are rescaled to sum to 1.
+    """
+    # Values saved for the same pages come in the same order
+    if list(previous) == list(pages):
+        ranks = np.fromiter(previous.values(), dtype=float, count=len(pages))
+    else:
+        ranks = np.fromiter(
+            map(previous.get, pages, itertools.repeat(1 / len(pages))),
+            dtype=float, count=len(pages)
+        )
+    return ranks / ranks.sum()
+
+
+def update_pagerank(corpus, damping_factor, previous, tolerance=TOLERANCE):
+    """
+    Return PageRank values for each page of a corpus that changed since
+    the `previous` PageRank values were computed, starting from those
+    values rather than from a uniform distribution.
+
+    Since random jumps (including those from pages with no links) land on
+    every page alike, PageRank is proportional to the solution z of
+    z(p) = 1 + damping_factor * sum(z(i) / NumLinks(i)), summing over the
+    pages i with links that link to p. Starting from the previous values,
+    the residual of that system (how far each page is from satisfying it)
+    is computed with a single sweep, and is only large around pages whose
+    links changed. Residuals large enough to break `tolerance` on their
+    own are then pushed along links. Each round of pushes only touches the
+    pages with large residuals and the pages they link to, so its work
+    grows with the region around the changes rather than with the corpus.
+
+    Once a round would push residuals on over PUSH_FRACTION of the pages,
+    they have spread too thin for pushing to pay off, and power iteration
+    finishes from the pushed values, stopping once the L1 change between
+    iterations is at most `tolerance`, like `matrix_pagerank`.
+    """
+    matrix = corpus if isinstance(corpus, LinkMatrix) else link_matrix(corpus)
+    pages = matrix.pages
+    n = len(pages)
+    dangling = matrix.outdegree == 0
+
+    # Scale the previous ranks to the unnormalized system. Away from the
+    # changes, z - damping_factor * sum(z(i) / NumLinks(i)) is the same
+    # for every page, so the scale that makes its median 1 leaves
+    # residuals only around the changes. If most pages changed, the median
+    # may not be positive, so fall back to the scale of a corpus with no
+    # pages without links.
+    ranks = warm_start(pages, previous)
+    excess = ranks - damping_factor * propagate(
+        matrix, np.where(dangling, 0, ranks)
+    )
+    median = np.median(excess)
+    if np.isfinite(median) and median > 0:
+        scale = 1 / median
+    else:
+        scale = 1 / ((1 - damping_factor) * ranks.mean())
+    ranks *= scale
+    residual = 1 - scale * excess
+
+    # Residuals over `tolerance` of the total on their own
+    threshold = tolerance * np.abs(ranks).sum()
+    last = np.empty(n, dtype=np.int64)
+    pushed = np.flatnonzero(np.abs(residual) > threshold)
+    while 0 < len(pushed) <= PUSH_FRACTION * n:
+
+        # Move each pushed residual into the page's rank, and pass
+        # its share on to the pages it links to
+        amounts = residual[pushed]
+        ranks[pushed] += amounts
+        residual[pushed] = 0
+        links = matrix.outgoing[pushed]
+        shares = damping_factor * links.data * np.repeat(
+            amounts, np.diff(links.indptr)
+        )
+        np.add.at(residual, links.indices, shares)
+
+        # Only pages that just received residual can exceed the threshold.
+        # Each is pushed once, found by its last appearance among them
+        linked = links.indices[np.abs(residual[links.indices]) > threshold]
+        positions = np.arange(len(linked))
+        last[linked] = positions
+        pushed = linked[last[linked] == positions]
+
+    ranks, _ = power_iteration(matrix, damping_factor, tolerance,
+                               ranks / ranks.sum())
+    return dict(zip(pages, ranks.tolist()))
+
+
+def save_ranks(ranks, filename):
+    """
+    Save PageRank values to a JSON file.
+    """
+    with open(filename, "w") as f:
+        json.dump(ranks, f)
+
+
+def load_ranks(filename):
+    """
+    Load PageRank values saved by `save_ranks`.
+    """
+    with open(filename) as f:
+        return json.load(f)
+
+
+def link_matrix(corpus):
+    """
+    Return the links of `corpus` as a LinkMatrix.
+    """
+    pages = sorted(corpus)
+    ids = {page: i for i, page in enumerate(pages)}
+
+    # List every link as a (destination, source) pair of page ids
+    destinations = []
+    sources = []
+    for page in pages:
+        source = ids[page]
+        for link in corpus[page]:
+            destinations.append(ids[link])
+            sources.append(source)
+    destinations = np.array(destinations, dtype=np.int64)
+    sources = np.array(sources, dtype=np.int64)
+    return make_link_matrix(pages, destinations, sources)
+
+
+def make_link_matrix(pages, destinations, sources):
+    """
+    Return a LinkMatrix for `pages` with links given as arrays
+    of destination and source page ids. As in `crawl`, duplicate links
+    and links from a page to itself are left out.
+    """
+    # Sorting links by destination, then source, brings duplicates together
+    n = len(pages)
+    linked = destinations != sources
+    keys = np.sort(destinations[linked] * n + sources[linked])
+    keys = keys[np.diff(keys, prepend=-1) != 0]
+    destinations, sources = np.divmod(keys, n)
+
+    counts = np.bincount(destinations, minlength=n)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    outdegree = np.bincount(sources, minlength=n)
+    transition = scipy.sparse.csr_matrix(
+        (1 / outdegree[sources], sources, indptr),
+        shape=(len(pages), len(pages))
+    )
+    outgoing = transition.T.tocsr()
+    return LinkMatrix(pages, indptr, sources, outdegree, transition, outgoing)
+
+
+def propagate(matrix, ranks):
+    """
+    Return, for each page, the sum of PR(i) / NumLinks(i) over every
+    page i linking to it, computed as a sparse matrix-vector product.
+
+    `ranks` may also be a 2D array with one column per rank vector,
+    in which case every column is propagated at once.
+    """
+    return matrix.transition @ ranks
+
+
+def matrix_pagerank(corpus, damping_factor, tolerance=TOLERANCE,
+                    strategy="power"):
+    """
+    Return PageRank values for each page by iterating over the sparse
+    link matrix, until the L1 change between iterations is at most
+    `tolerance`, using one of the `STRATEGIES`.
+
+    `corpus` may be a corpus dictionary or a LinkMatrix. As in
+    `iterate_pagerank`, a page with no links is treated as having one
+    link for every page in the corpus (including itself).
+    """
+    matrix = corpus if isinstance(corpus, LinkMatrix) else link_matrix(corpus)
+    ranks, _ = STRATEGIES[strategy](matrix, damping_factor, tolerance)
+    return dict(zip(matrix.pages, ranks.tolist()))
+
+
+def power_iteration(matrix, damping_factor, tolerance, ranks=None):
+    """
+    Compute PageRank by power iteration (Jacobi sweeps): every page's
+    new value is computed from the previous iteration's values, starting
+    from `ranks` if given, or else from a uniform distribution.
+
+    Return the array of PageRank values and the number of iterations.
+    """
+    n = len(matrix.pages)
+    if ranks is None:
+        ranks = np.full(n, 1 / n)
+    iterations = 0
+    while True:
+        new_ranks = step(matrix, damping_factor, ranks)
+        iterations += 1
+        change = np.abs(new_ranks - ranks).sum()
+        ranks = new_ranks
+        if change <= tolerance:
+            return ranks, iterations
+
+
+def step(matrix, damping_factor, ranks):
+    """
+    Return the PageRank values after one power iteration from `ranks`.
+    """
+    n = len(matrix.pages)
+    dangling = matrix.outdegree == 0
+    return (1 - damping_factor) / n + damping_factor * (
+        propagate(matrix, ranks) + ranks[dangling].sum() / n
+    )
+
+
+def gauss_seidel(matrix, damping_factor, tolerance):
+    """
+    Compute PageRank by Gauss-Seidel sweeps, where each page's new value
+    is computed from the values of earlier pages already updated in the
+    same sweep: a sweep is a sparse triangular solve. The random jump and
+    the share of pages with no links come from the previous sweep.
+
+    Return the array of PageRank values and the number of iterations.
+    """
+    n = len(matrix.pages)
+    dangling = matrix.outdegree == 0
+    system = scipy.sparse.identity(n, format="csr") - damping_factor * matrix.transition
+    lower = scipy.sparse.tril(system, format="csr")
+    upper = scipy.sparse.triu(system, k=1, format="csr")
+
+    ranks = np.full(n, 1 / n)
+    iterations = 0
+    while True:
+        constant = (1 - damping_factor) / n + damping_factor * ranks[dangling].sum() / n
+        new_ranks = scipy.sparse.linalg.spsolve_triangular(
+            lower, constant - upper @ ranks, lower=True
+        )
+        iterations += 1
+        new_ranks /= new_ranks.sum()
+        change = np.abs(new_ranks - ranks).sum()
+        ranks = new_ranks
+        if change <= tolerance:
+            return ranks, iterations
+
+
+def extrapolated_iteration(matrix, damping_factor, tolerance, extrapolate,
+                           history, period=10):
+    """
+    Compute PageRank by power iteration, replacing the current iterate
+    every `period` iterations by `extrapolate` applied to the last
+    `history` iterates.
+
+    Return the array of PageRank values and the number of iterations.
+    """
+    n = len(matrix.pages)
+    iterates = [np.full(n, 1 / n)]
+    iterations = 0
+    while True:
+        new_ranks = step(matrix, damping_factor, iterates[-1])
+        iterations += 1
+        change = np.abs(new_ranks - iterates[-1]).sum()
+        iterates = iterates[1 - history:] + [new_ranks]
+        if change <= tolerance:
+            return new_ranks, iterations
+        if iterations % period == 0 and len(iterates) == history:
+            extrapolated = np.maximum(extrapolate(iterates), 0)
+            iterates = [extrapolated / extrapolated.sum()]
+
+
+def aitken(iterates):
+    """
+    Return the Aitken delta-squared extrapolation of three iterates,
+    page by page, keeping the last iterate where it is undefined.
+    """
+    x0, x1, x2 = iterates
+    second = x2 - 2 * x1 + x0
+    safe = np.abs(second) > 1e-15
+    extrapolated = x2.copy()
+    extrapolated[safe] -= (x2 - x1)[safe] ** 2 / second[safe]
+    return extrapolated
+
+
+def quadratic(iterates):
+    """
+    Return the quadratic extrapolation of four iterates, which assumes
+    the error lies in the span of the iteration's next two eigenvectors
+    (Kamvar et al., "Extrapolation Methods for Accelerating PageRank
+    Computations").
+    """
+    x0, x1, x2, x3 = iterates
+    y = np.column_stack([x1 - x0, x2 - x0])
+    gamma, *_ = np.linalg.lstsq(y, -(x3 - x0), rcond=None)
+    gamma = [gamma[0], gamma[1], 1]
+    return (
+        (gamma[0] + gamma[1] + gamma[2]) * x1
+        + (gamma[1] + gamma[2]) * x2
+        + gamma[2] * x3
+    )
+
+
+def adaptive_iteration(matrix, damping_factor, tolerance):
+    """
+    Compute PageRank by power iteration, freezing pages as they converge:
+    a page whose value changes by at most tolerance / N is no longer
+    recomputed, and the link matrix is cut down to the remaining pages'
+    rows whenever enough pages have been frozen.
+
+    Return the array of PageRank values and the number of iterations.
+    """
+    n = len(matrix.pages)
+    dangling = matrix.outdegree == 0
+    ranks = np.full(n, 1 / n)
+    active = np.arange(n)
+    rows = matrix.transition
+    iterations = 0
+    while True:
+        values = (1 - damping_factor) / n + damping_factor * (
+            rows @ ranks + ranks[dangling].sum() / n
+        )
+        iterations += 1
+        changes = np.abs(values - ranks[active])
+        ranks[active] = values
+        if changes.sum() <= tolerance:
+            return ranks, iterations
+
+        # Freeze converged pages, cutting down the matrix when worthwhile
+        moving = changes > tolerance / n
+        if moving.sum() < 0.75 * len(active):
+            active = active[moving]
+            rows = matrix.transition[active]
+        if not len(active):
+            return ranks, iterations
+
+
+# Ways of computing PageRank from a LinkMatrix, by name
+STRATEGIES = {
+    "power": power_iteration,
+    "gauss-seidel": gauss_seidel,
+    "aitken": lambda matrix, damping_factor, tolerance: extrapolated_iteration(
+        matrix, damping_factor, tolerance, aitken, 3
+    ),
+    "quadratic": lambda matrix, damping_factor, tolerance: extrapolated_iteration(
+        matrix, damping_factor, tolerance, quadratic, 4
+    ),
+    "adaptive": adaptive_iteration
+}
+
+
 if __name__ == "__main__":
     main()
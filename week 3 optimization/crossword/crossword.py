@@ -9,6 +9,7 @@ class Variable():
         self.j = j
         self.direction = direction
         self.length = length
+        self.hash = hash((self.i, self.j, self.direction, self.length))
         self.cells = []
         for k in range(self.length):
             self.cells.append(
@@ -17,7 +18,7 @@ class Variable():
             )
 
     def __hash__(self):
-        return hash((self.i, self.j, self.direction, self.length))
+        return self.hash
 
     def __eq__(self, other):
         return (
@@ -61,8 +62,9 @@ class Crossword():
         with open(words_file) as f:
             self.words = set(f.read().upper().splitlines())
 
-        # Determine variable set
-        self.variables = set()
+        # Determine variable set, and each variable's id: its index in
+        # the order variables are found in
+        self.variable_list = []
         for i in range(self.height):
             for j in range(self.width):
 
@@ -79,7 +81,7 @@ class Crossword():
                         else:
                             break
                     if length > 1:
-                        self.variables.add(Variable(
+                        self.variable_list.append(Variable(
                             i=i, j=j,
                             direction=Variable.DOWN,
                             length=length
@@ -98,36 +100,58 @@ class Crossword():
                         else:
                             break
                     if length > 1:
-                        self.variables.add(Variable(
+                        self.variable_list.append(Variable(
                             i=i, j=j,
                             direction=Variable.ACROSS,
                             length=length
                         ))
 
+        self.variables = set(self.variable_list)
+        self.ids = {var: n for n, var in enumerate(self.variable_list)}
+
         # Compute overlaps for each word
         # For any pair of variables v1, v2, their overlap is either:
         #    None, if the two variables do not overlap; or
         #    (i, j), where v1's ith character overlaps v2's jth character
-        self.overlaps = dict()
-        for v1 in self.variables:
-            for v2 in self.variables:
-                if v1 == v2:
+        # Only an across and a down variable can overlap, in a cell both
+        # contain, so map each cell to the across variable containing it
+        across = dict()
+        for var in self.variable_list:
+            if var.direction == Variable.ACROSS:
+                for k, cell in enumerate(var.cells):
+                    across[cell] = (var, k)
+
+        # `self.adjacency[id]` lists (neighbor id, i, j) for each variable
+        # overlapping the variable with that id, at its ith character and
+        # the neighbor's jth character
+        self.overlaps = Overlaps()
+        self.adjacency = [[] for _ in self.variable_list]
+        for v1 in self.variable_list:
+            if v1.direction != Variable.DOWN:
+                continue
+            for k1, cell in enumerate(v1.cells):
+                if cell not in across:
                     continue
-                cells1 = v1.cells
-                cells2 = v2.cells
-                intersection = set(cells1).intersection(cells2)
-                if not intersection:
-                    self.overlaps[v1, v2] = None
-                else:
-                    intersection = intersection.pop()
-                    self.overlaps[v1, v2] = (
-                        cells1.index(intersection),
-                        cells2.index(intersection)
-                    )
+                v2, k2 = across[cell]
+                self.overlaps[v1, v2] = (k1, k2)
+                self.overlaps[v2, v1] = (k2, k1)
+                self.adjacency[self.ids[v1]].append((self.ids[v2], k1, k2))
+                self.adjacency[self.ids[v2]].append((self.ids[v1], k2, k1))
+        self.neighbor_sets = [
+            frozenset(self.variable_list[n] for n, _, _ in adjacent)
+            for adjacent in self.adjacency
+        ]
 
     def neighbors(self, var):
         """Given a variable, return set of overlapping variables."""
-        return set(
-            v for v in self.variables
-            if v != var and self.overlaps[v, var]
-        )
+        return self.neighbor_sets[self.ids[var]]
+
+
+class Overlaps(dict):
+    """
+    Dictionary mapping pairs of overlapping variables to their overlap,
+    and any other pair of variables to None.
+    """
+
+    def __missing__(self, key):
+        return None
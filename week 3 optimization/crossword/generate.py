@@ -1,7 +1,14 @@
 import sys
 
+from collections import deque
 from crossword import *
-import copy
+import itertools
+
+# Largest number of words a bitset is decoded one word at a time rather
+# than a byte at a time, and largest number of words removed from a
+# domain whose letter counts are updated word by word rather than counted
+# again from the bitset index
+SPARSE = 64
 
 
 class CrosswordCreator():
@@ -9,12 +16,142 @@ class CrosswordCreator():
     def __init__(self, crossword):
         """
         Create new CSP crossword generate.
+
+        Domains are stored in `self.bits` as bitsets over `self.words`:
+        bit i of a variable's bitset is set if `self.words[i]` is in its
+        domain. `self.letters` maps (length, position) to a dictionary
+        mapping each letter to the bitset of words of that length with
+        that letter at that position, and `self.lengths` maps each length
+        to the bitset of its words.
+
+        `self.counts` maps each variable to a dictionary mapping each
+        position it overlaps a neighbor at to a dictionary mapping letters
+        to the number of words in its domain, of the variable's length,
+        with that letter there.
+
+        `self.trail` records (variable, bitset, counts) for every domain
+        change, so backtracking can restore domains by undoing them.
         """
         self.crossword = crossword
-        self.domains = {
-            var: self.crossword.words.copy()
-            for var in self.crossword.variables
+        self.words = sorted(sorted(self.crossword.words), key=len)
+        self.ids = {word: i for i, word in enumerate(self.words)}
+        self.index_words()
+        everything = (1 << len(self.words)) - 1
+        self.bits = {var: everything for var in self.crossword.variables}
+        self.counts = {var: self.count_letters(var) for var in self.bits}
+        self.trail = []
+        self.nodes = 0
+
+    def index_words(self):
+        """
+        Build `self.letters` and `self.lengths` from `self.words`.
+        """
+        self.letters = dict()
+        self.lengths = dict()
+
+        # Words are sorted by length, so each length is a run of word ids
+        start = 0
+        for length, group in itertools.groupby(self.words, key=len):
+            group = list(group)
+            self.lengths[length] = ((1 << len(group)) - 1) << start
+            # Read the bitset of each letter off a string of the letters at
+            # each position, last word first, mapped to binary digits
+            for k, column in enumerate(zip(*reversed(group))):
+                column = "".join(column)
+                digits = dict.fromkeys(map(ord, set(column)), "0")
+                self.letters[length, k] = dict()
+                for letter in set(column):
+                    digits[ord(letter)] = "1"
+                    bits = int(column.translate(digits), 2) << start
+                    digits[ord(letter)] = "0"
+                    self.letters[length, k][letter] = bits
+            start += len(group)
+
+    def to_bitset(self, ids):
+        """
+        Return the bitset with the bits of word ids `ids` set.
+        """
+        data = bytearray((len(self.words) + 7) // 8)
+        for i in ids:
+            data[i >> 3] |= 1 << (i & 7)
+        return int.from_bytes(data, "little")
+
+    def domain(self, var):
+        """
+        Return the list of words in the domain of `var`, in word order.
+        """
+        return self.decode(self.bits[var])
+
+    def decode(self, bits):
+        """
+        Return the list of words in bitset `bits`, in word order.
+        """
+        words = []
+        if bits.bit_count() <= SPARSE:
+            while bits:
+                low = bits & -bits
+                words.append(self.words[low.bit_length() - 1])
+                bits ^= low
+            return words
+
+        data = bits.to_bytes((len(self.words) + 7) // 8, "little")
+        for i, byte in enumerate(data):
+            while byte:
+                low = byte & -byte
+                words.append(self.words[8 * i + low.bit_length() - 1])
+                byte ^= low
+        return words
+
+    @property
+    def domains(self):
+        """
+        Dictionary mapping each variable to the set of words in its domain.
+        """
+        return {var: set(self.domain(var)) for var in self.bits}
+
+    @domains.setter
+    def domains(self, domains):
+        self.bits = {
+            var: self.to_bitset(
+                self.ids[word] for word in words if word in self.ids
+            )
+            for var, words in domains.items()
         }
+        self.counts = {var: self.count_letters(var) for var in self.bits}
+
+    def count_letters(self, var):
+        """
+        Return the letter counts of the domain of `var` at each position
+        it overlaps a neighbor at, as stored in `self.counts`.
+        """
+        counts = dict()
+        for neighbor in self.crossword.neighbors(var):
+            i, _ = self.crossword.overlaps[var, neighbor]
+            counts[i] = {
+                letter: (self.bits[var] & bits).bit_count()
+                for letter, bits in self.letters.get((var.length, i), {}).items()
+            }
+        return counts
+
+    def narrow(self, var, bits):
+        """
+        Shrink the domain of `var` to bitset `bits`, recording the change
+        in `self.trail` and updating the letter counts of the domain.
+        """
+        self.trail.append((var, self.bits[var], self.counts[var]))
+        removed = self.bits[var] & ~bits & self.lengths.get(var.length, 0)
+        self.bits[var] = bits
+        if removed.bit_count() > SPARSE:
+            self.counts[var] = self.count_letters(var)
+            return
+
+        # Subtract the letters of the removed words from a copy of the
+        # counts, leaving the recorded counts to restore
+        counts = {i: kept.copy() for i, kept in self.counts[var].items()}
+        for word in self.decode(removed):
+            for i, kept in counts.items():
+                kept[word[i]] -= 1
+        self.counts[var] = counts
 
     def letter_grid(self, assignment):
         """
@@ -91,7 +228,8 @@ class CrosswordCreator():
         Enforce node and arc consistency, and then solve the CSP.
         """
         self.enforce_node_consistency()
-        self.ac3()
+        if not self.ac3():
+            return None
         return self.backtrack(dict())
 
     def enforce_node_consistency(self):
@@ -101,15 +239,9 @@ class CrosswordCreator():
          constraints; in this case, the length of the word.)
         """
 
-        domains = copy.deepcopy(self.domains)
-
-        for var in domains:
-            for word in domains[var]:
-                # If the word is not the same length as the variable, remove it from the domain
-                if len(word) != var.length:
-                    self.domains[var].remove(word)
-
-        return
+        for var in self.bits:
+            # Keep only the words of the same length as the variable
+            self.narrow(var, self.bits[var] & self.lengths.get(var.length, 0))
 
 
     def revise(self, x, y):
@@ -122,29 +254,27 @@ class CrosswordCreator():
         False if no revision was made.
         """
 
-        # Set revised to false
-        revised = False
-
         # Get the overlap between the two variables
         overlap = self.crossword.overlaps[x, y]
+        if overlap is None:
+            return False
+        i, j = overlap
 
-        # Make a domains copy
-        domains = copy.deepcopy(self.domains)
-
-        # If there is overlap
-        if overlap[0]:
-            for word_x in domains[x]: # For each word in the domain of x
-                matched = False
-                for word_y in self.domains[y]: # For each word in the domain of y
-                    if word_x[overlap[0]] == word_y[overlap[1]]: # If the overlap matches
-                        matched = True
-                        break
-                if matched: continue # If there is a match, continue
-                else:
-                    self.domains[x].remove(word_x)
-                    revised = True
+        # Words of x with a letter at the overlap that some word of y has
+        letters = {
+            letter for letter, bits in self.letters.get((y.length, j), {}).items()
+            if self.bits[y] & bits
+        }
+        supported = 0
+        for letter, bits in self.letters.get((x.length, i), {}).items():
+            if letter in letters:
+                supported |= bits
 
-        return revised
+        revised = self.bits[x] & supported
+        if revised == self.bits[x]:
+            return False
+        self.narrow(x, revised)
+        return True
 
 
     def ac3(self, arcs=None):
@@ -160,18 +290,24 @@ class CrosswordCreator():
         # If arcs is None, set it to all arcs
         if arcs is None:
             arcs = []
-            for var1 in self.domains:
+            for var1 in self.bits:
                 for var2 in self.crossword.neighbors(var1):
                     if self.crossword.overlaps[var1, var2]:
                         arcs.append((var1, var2))
 
+        # Queue each arc at most once at a time
+        arcs = deque(dict.fromkeys(arcs))
+        queued = set(arcs)
         while len(arcs) > 0:
-            x, y = arcs.pop()
+            x, y = arcs.popleft()
+            queued.discard((x, y))
             if self.revise(x, y):
-                if not self.domains[x]:
+                if not self.bits[x]:
                     return False
                 for z in self.crossword.neighbors(x) - {y}:
-                    arcs.append((z, x))
+                    if (z, x) not in queued:
+                        queued.add((z, x))
+                        arcs.append((z, x))
 
         return True
 
@@ -182,7 +318,7 @@ class CrosswordCreator():
         crossword variable); return False otherwise.
         """
 
-        for var in self.domains:
+        for var in self.bits:
             if var not in assignment:
                 return False
         return True
@@ -223,24 +359,22 @@ class CrosswordCreator():
         that rules out the fewest values among the neighbors of `var`.
         """
 
-        ruled_out = {}
+        # A word of var with letter c at an overlap rules out all the
+        # neighbour's words but those with c there, counted in self.counts
+        counts = []
+        for neighbour in self.crossword.neighbors(var):
+            # don't count if neighbor has already assigned value
+            if neighbour in assignment:
+                continue
+            i, j = self.crossword.overlaps[var, neighbour]
+            kept = self.counts[neighbour][j]
+            counts.append((i, kept, self.bits[neighbour].bit_count()))
 
-        # iterating through var's words
-        for word in self.domains[var]:
-            eliminated = 0
-            for neighbour in self.crossword.neighbors(var):
-                # don't count if neighbor has already assigned value
-                if neighbour in assignment:
-                    continue
-                else:
-                    # calculate overlap between two variables
-                    overlap = self.crossword.overlaps[var, neighbour]
-                    for neighbour_word in self.domains[neighbour]:
-                        # iterate through neighbour's words, check for eliminate ones
-                        if word[overlap[0]] != neighbour_word[overlap[1]]:
-                            eliminated += 1
-            # add eliminated neighbour's words to temporary dict
-            ruled_out[word] = eliminated
+        ruled_out = {}
+        for word in self.domain(var):
+            ruled_out[word] = sum(
+                total - kept.get(word[i], 0) for i, kept, total in counts
+            )
 
         return sorted([v for v in ruled_out], key = lambda v: ruled_out[v])
 
@@ -255,12 +389,11 @@ class CrosswordCreator():
         """
         
         # Get unassigned variables
-        unassigned = set(self.domains.keys()) - set(assignment.keys())
-        
-        result = [var for var in unassigned]
-        result.sort(key = lambda x: (len(self.domains[x]), -len(self.crossword.neighbors(x))))
+        unassigned = set(self.bits.keys()) - set(assignment.keys())
 
-        return result[0]
+        return min(unassigned, key=lambda x: (
+            self.bits[x].bit_count(), -len(self.crossword.neighbors(x))
+        ))
 
 
     def backtrack(self, assignment):
@@ -273,27 +406,46 @@ class CrosswordCreator():
         If no assignment is possible, return None.
         """
 
+        self.nodes += 1
+
         # checking if assignment is complete
-        if len(assignment) == len(self.domains):
+        if len(assignment) == len(self.bits):
             return assignment
 
         # select unassigned variable
         variable = self.select_unassigned_variable(assignment)
 
         # iterating through words in that variable
-        for value in self.domains[variable]:
-            current_assignment = copy.deepcopy(assignment)
-            current_assignment[variable] = value
-            """ assignment[variable] = value """
-            # check if assignment is consistent
-            """ if self.consistent(assignment): """
-            """     if self.backtrack(assignment) is not None: """
-            """         return self.backtrack(assignment) """
-            if self.backtrack(current_assignment) is not None:
-                return self.backtrack(current_assignment)
+        for value in self.order_domain_values(variable, assignment):
+            assignment[variable] = value
+            if self.consistent(assignment):
+                # Narrow the variable's domain to the value, and maintain
+                # arc consistency of its unassigned neighbours with it
+                mark = len(self.trail)
+                self.narrow(variable, 1 << self.ids[value])
+                arcs = [
+                    (neighbour, variable)
+                    for neighbour in self.crossword.neighbors(variable)
+                    if neighbour not in assignment
+                ]
+                if self.ac3(arcs):
+                    result = self.backtrack(assignment)
+                    if result is not None:
+                        return result
+                self.undo(mark)
+            del assignment[variable]
 
         return None
 
+    def undo(self, mark):
+        """
+        Restore the domains changed since `self.trail` had `mark` entries.
+        """
+        while len(self.trail) > mark:
+            var, bits, counts = self.trail.pop()
+            self.bits[var] = bits
+            self.counts[var] = counts
+
 
 def main():
 
@@ -310,6 +462,7 @@ def main():
     crossword = Crossword(structure, words)
     creator = CrosswordCreator(crossword)
     assignment = creator.solve()
+    print(f"Nodes explored: {creator.nodes}")
 
     # Print result
     if assignment is None: